@@ -0,0 +1,66 @@
+# Word picking: ORDER BY RANDOM() over sent_words (the old query) against the
+# shuffle cursor, at 1k, 100k and 1M words for a user who has seen 0%, 50%
+# and 99% of them.
+#   python bench/bench_cursor.py
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lingo
+
+OLD_PICK_SQL = """
+    SELECT w.* FROM words w
+    LEFT JOIN sent_words s ON w.id = s.word_id AND s.user_id = ?
+    WHERE s.word_id IS NULL
+    ORDER BY RANDOM() LIMIT 1
+"""
+
+def setup(n, path):
+    lingo.DB_PATH = path
+    lingo.init_db()
+    with lingo.db() as c:
+        c.executemany(
+            "INSERT INTO words (topic, word, level, shuffle_key) VALUES ('t', ?, 'A1', ?)",
+            ((f"w{i}", lingo.new_seed()) for i in range(n))
+        )
+        c.execute("CREATE TABLE sent_words (user_id INTEGER, word_id INTEGER, PRIMARY KEY (user_id, word_id))")
+
+def main():
+    tmp = tempfile.mkdtemp()
+    for n in (1000, 100_000, 1_000_000):
+        setup(n, os.path.join(tmp, f"words{n}.db"))
+        keys = [r[0] for r in lingo.db().execute("SELECT shuffle_key FROM words ORDER BY shuffle_key")]
+        for frac in (0, 0.5, 0.99):
+            seen = int(n * frac)
+            pos = keys[seen - 1] if seen else None
+            with lingo.db() as c:
+                c.execute("DELETE FROM sent_words")
+                c.execute("DELETE FROM word_cursor")
+                c.executemany("INSERT INTO sent_words VALUES (1, ?)", ((i + 1,) for i in range(seen)))
+                # The walk's seed is the smallest key, so pos marks the same share
+                c.execute(
+                    "INSERT INTO word_cursor (user_id, filter_key, seed, pos, wrapped) VALUES (1, '', ?, ?, 0)",
+                    (keys[0], pos)
+                )
+
+            reps = 20 if n >= 100_000 else 200
+            c = lingo.db()
+            started = perf_counter()
+            for _ in range(reps):
+                c.execute(OLD_PICK_SQL, (1,)).fetchone()
+            old = (perf_counter() - started) / reps * 1000
+
+            started = perf_counter()
+            for _ in range(reps):
+                with lingo.db() as c:
+                    c.execute("UPDATE word_cursor SET pos=? WHERE user_id=1", (pos,))
+                lingo.pick_word_for_user(1)
+            new = (perf_counter() - started) / reps * 1000
+
+            print(f"{n:>9} words  seen {int(frac * 100):>2}%  old {old:9.3f} ms  new {new:7.3f} ms")
+
+if __name__ == "__main__":
+    main()
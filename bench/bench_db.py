@@ -0,0 +1,77 @@
+# A new connection per call with the rollback journal (the old db()) against
+# the shared WAL connections and the writer thread, for the Get Word and
+# /start paths.
+#   python bench/bench_db.py
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+from time import perf_counter
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lingo
+
+N = 2000
+START_SQL = "INSERT OR IGNORE INTO users (user_id) VALUES (?)"
+
+def old_db():
+    conn = sqlite3.connect(lingo.DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def old_pick(uid):
+    with old_db() as c:
+        cur = c.execute(lingo.CURSOR_SQL, (uid, "")).fetchone()
+        seed, pos, wrapped = (cur["seed"], cur["pos"], cur["wrapped"]) if cur else (lingo.new_seed(), None, 0)
+        rows = lingo.next_in_walk(c, seed, pos, wrapped, 1)
+        c.execute(
+            "INSERT OR REPLACE INTO word_cursor (user_id, filter_key, seed, pos, wrapped) VALUES (?,'',?,?,?)",
+            (uid, seed, rows[0]["shuffle_key"], wrapped)
+        )
+
+def old_start(uid):
+    with old_db() as c:
+        c.execute(START_SQL, (uid,))
+
+async def new_paths():
+    for name, call in (
+        ("pick_word_for_user", lambda i: lingo.db_write(lingo.pick_word_for_user, i % 50)),
+        ("start", lambda i: lingo.db_write(lingo.query, START_SQL, (i % 50 + 1000,))),
+    ):
+        started = perf_counter()
+        for i in range(N):
+            await call(i)
+        sequential = (perf_counter() - started) / N * 1000
+
+        started = perf_counter()
+        await asyncio.gather(*(call(i) for i in range(N)))
+        concurrent = (perf_counter() - started) / N * 1000
+        print(f"new {name:20s} {sequential:.3f} ms/op sequential, "
+              f"{concurrent:.3f} ms/op with {N} concurrent callers")
+
+def main():
+    lingo.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    lingo.init_db()
+    with lingo.db() as c:
+        c.executemany(
+            "INSERT INTO words (topic, word, shuffle_key) VALUES ('t', ?, ?)",
+            ((f"w{i}", lingo.new_seed()) for i in range(100_000))
+        )
+    lingo.db().close()
+    lingo._db_local.conn = None
+
+    c = sqlite3.connect(lingo.DB_PATH)
+    c.execute("PRAGMA journal_mode=DELETE")
+    c.close()
+    for name, fn in (("pick_word_for_user", old_pick), ("start", old_start)):
+        started = perf_counter()
+        for i in range(N):
+            fn(i % 50)
+        print(f"old {name:20s} {(perf_counter() - started) / N * 1000:.3f} ms/op")
+
+    asyncio.run(new_paths())
+
+if __name__ == "__main__":
+    main()
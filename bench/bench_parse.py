@@ -0,0 +1,62 @@
+# Parse time and peak memory per fixture page: the old path (r.text, then a
+# full html.parser tree) against parse_cambridge / parse_webster.
+#   python bench/bench_parse.py
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+os.environ.setdefault("GROQ_API_KEY", "bench")
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import lingo
+from bs4 import BeautifulSoup
+
+CAMBRIDGE_FIELDS = [
+    ("parts", ".pos.dpos"), ("level", ".epp-xref"), ("definition", ".def.ddef_d"),
+    ("example", ".examp.dexamp"), ("pronunciation", ".ipa"),
+]
+WEBSTER_FIELDS = [
+    ("parts", ".important-blue-link"), ("definition", ".sense.has-sn"),
+    ("example", ".ex-sent"), ("pronunciation", ".pr"),
+]
+
+def old_parser(fields, source):
+    def parse(word, html):
+        soup = BeautifulSoup(html, "html.parser")
+        data = lingo.empty_word_data(word)
+        for key, selector in fields:
+            el = soup.select_one(selector)
+            if el:
+                data[key] = el.text.strip()
+        data["source"] = source
+        return data
+    return parse
+
+def measure(fn, args, reps=20):
+    out = fn(*args)
+    started = perf_counter()
+    for _ in range(reps):
+        fn(*args)
+    per_page = (perf_counter() - started) / reps * 1000
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, per_page, peak / 1e6
+
+def main():
+    for name, old, new in (
+        ("cambridge_run.html", old_parser(CAMBRIDGE_FIELDS, "Cambridge"), lingo.parse_cambridge),
+        ("webster_run.html", old_parser(WEBSTER_FIELDS, "Merriam-Webster"), lingo.parse_webster),
+    ):
+        with open(os.path.join(HERE, "fixtures", name), "rb") as f:
+            body = f.read()
+        old_out, old_ms, old_mb = measure(old, ("run", body.decode("utf-8")))
+        new_out, new_ms, new_mb = measure(new, ("run", body, "utf-8"))
+        print(f"{name} {len(body) / 1024:.0f} KB  "
+              f"old {old_ms:.1f} ms / {old_mb:.1f} MB peak  "
+              f"new {new_ms:.1f} ms / {new_mb:.1f} MB peak  same={old_out == new_out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,27 @@
 import os
 import re
+import sys
+import csv
+import tempfile
+import json
+import gzip
+import shutil
+import struct
+import asyncio
+import hashlib
+import threading
+import random
 import sqlite3
 from datetime import datetime, time
+from time import time as now_ts, perf_counter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pytz
-from groq import Groq
+from groq import AsyncGroq
 from telegram import Update, ReplyKeyboardMarkup
-import requests
-from bs4 import BeautifulSoup
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
 from telegram.ext import (
     ApplicationBuilder, ContextTypes, CommandHandler,
     CallbackQueryHandler, ConversationHandler, MessageHandler, filters
@@ -24,6 +39,8 @@ DAILY_COUNT = 31
 DAILY_TIME = 32
 DAILY_LEVEL = 33
 DAILY_POS = 34
+DAILY_TZ = 35
+DAILY_MODE = 36
 
 # ================= CONFIG =================
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -31,15 +48,54 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 ADMIN_IDS = {527164608}
 DB_PATH = "daily_words.db"
 
-client = Groq(api_key=GROQ_API_KEY)
+AI_TIMEOUT = 30.0
+client = AsyncGroq(api_key=GROQ_API_KEY, timeout=AI_TIMEOUT, max_retries=1)
+AI_MODEL = "llama-3.1-8b-instant"
+AI_PROMPT_VERSION = 1  # bump when the fill-missing prompt changes
 HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+HTTP_PER_HOST = 4
+HTTP_RETRIES = 3
+CAMBRIDGE_URL = "https://dictionary.cambridge.org/dictionary/english/{}"
+WEBSTER_URL = "https://www.merriam-webster.com/dictionary/{}"
+SCRAPE_HEDGE_AFTER = 1.5  # seconds before the next source is started alongside
+BREAKER_FAILURES = 5      # consecutive failures that open a source's breaker
+BREAKER_COOLDOWN = 60
+BREAKER_MAX_COOLDOWN = 15 * 60
+SCRAPE_CACHE_TTL = 30 * 24 * 3600
+SCRAPE_CACHE_NEGATIVE_TTL = 24 * 3600
+SCRAPE_CACHE_MAX = 50000
+BULK_CONCURRENCY = 8
+AI_BATCH_SIZE = 20
+SEND_RATE = 25           # messages per second across all chats (Telegram allows ~30)
+SEND_CHAT_INTERVAL = 1.0 # seconds between messages to the same chat
+SEND_RETRIES = 4
+BROADCAST_WORKERS = 20
+DAILY_WORKERS = 20
+OUTBOX_BATCH = 500
+OUTBOX_MAX_ATTEMPTS = 6   # fast retries (1, 2, 4... min), then hourly
+OUTBOX_SLOW_RETRY = 3600
+OUTBOX_MAX_AGE = 86400    # a word still unsent a day after its minute fails
+OUTBOX_FAILED_KEEP = 7 * 86400
+PRECOMPUTE_CHUNK = 500
+DIGEST_MAX_CHARS = 4000  # Telegram caps messages at 4096; leave room for markup
+BULK_PROGRESS_EVERY = 20
+IMPORT_BATCH = 5000
+IMPORT_MAX_ERRORS = 20   # error lines quoted back to the admin
+BACKUP_DIR = "backups"
+BACKUP_INCREMENTAL = os.getenv("BACKUP_INCREMENTAL") == "1"
+BACKUP_FULL_EVERY = 7    # nightly deltas between two full backups
 
 # ================= FALLBACK / CANCEL =================
 async def cancel(update, context):
     context.user_data.clear()
     uid = update.effective_user.id
+    task = AI_TASKS.pop(uid, None)
+    if task:
+        task.cancel()
     await update.message.reply_text(
         "Operation cancelled.",
         reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
@@ -47,13 +103,44 @@ async def cancel(update, context):
     return ConversationHandler.END
 
 # ================= DATABASE =================
+# Each thread keeps one tuned connection. Async code never touches SQLite on
+# the event loop: reads run on a small reader pool and every write goes
+# through the single writer thread, so writers never fight over the lock.
+DB_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+]
+_db_local = threading.local()
+_db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_db_readers = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-reader")
+
 def db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_db_local, "conn", None)
+    if conn is None or _db_local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        _db_local.conn, _db_local.path = conn, DB_PATH
     return conn
 
-def init_db():
+async def db_write(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_writer, fn, *args)
+
+async def db_read(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_readers, fn, *args)
+
+def query(sql, params=()):
     with db() as c:
+        return c.execute(sql, params).fetchall()
+
+def init_db():
+    c = db()
+    with c:
         c.executescript("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
@@ -86,12 +173,313 @@ def init_db():
             level TEXT,
             source TEXT
         );
-        CREATE TABLE IF NOT EXISTS sent_words (
-            user_id INTEGER,
-            word_id INTEGER,
-            PRIMARY KEY (user_id, word_id)
-        );
         """)
+    migrate(c)
+    reclaim_free_pages(c)
+
+# Dropped tables leave their pages on the freelist; hand them back to the
+# disk (and to the backups) once they make up a good part of the file.
+def reclaim_free_pages(c):
+    free = c.execute("PRAGMA freelist_count").fetchone()[0]
+    total = c.execute("PRAGMA page_count").fetchone()[0]
+    if total and free > total // 4:
+        c.execute("VACUUM")
+        print(f"🧹 Reclaimed {free} free pages of {total}")
+
+def add_column(c, table, column, decl):
+    cols = [r["name"] for r in c.execute(f"PRAGMA table_info({table})")]
+    if column not in cols:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+# ================= MIGRATIONS =================
+# PRAGMA user_version is the number of MIGRATIONS already applied. Each step
+# runs in its own transaction together with the version bump. Add new steps
+# at the end and never edit old ones. Steps are idempotent so databases from
+# before versioning upgrade cleanly.
+def migration_shuffle_cursor(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS word_cursor (
+            user_id INTEGER PRIMARY KEY,
+            seed INTEGER NOT NULL,
+            pos INTEGER,
+            wrapped INTEGER DEFAULT 0
+        )
+    """)
+
+    # Every word gets a fixed random key; walking the keys in order is a shuffle
+    add_column(c, "words", "shuffle_key", "INTEGER")
+    c.execute("UPDATE words SET shuffle_key = random() WHERE shuffle_key IS NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_words_shuffle ON words(shuffle_key)")
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_words_shuffle AFTER INSERT ON words
+        WHEN NEW.shuffle_key IS NULL
+        BEGIN
+            UPDATE words SET shuffle_key = random() WHERE id = NEW.id;
+        END
+    """)
+
+def migration_user_timezones(c):
+    add_column(c, "users", "timezone", "TEXT DEFAULT 'Asia/Tehran'")
+    add_column(c, "users", "daily_utc_minute", "INTEGER")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_daily_utc "
+        "ON users(daily_enabled, daily_utc_minute)"
+    )
+
+def migration_lookup_caches(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_cache (
+            word_key TEXT,
+            source TEXT,
+            data TEXT,
+            fetched_at INTEGER,
+            last_used INTEGER,
+            PRIMARY KEY (word_key, source)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_scrape_cache_used ON scrape_cache(last_used)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT,
+            created_at INTEGER
+        )
+    """)
+
+def migration_list_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_personal_words_user ON personal_words(user_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_words_topic_level ON words(topic, level, id)")
+
+def migration_user_active(c):
+    add_column(c, "users", "active", "INTEGER DEFAULT 1")
+
+def migration_daily_outbox(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS daily_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            scheduled_at INTEGER NOT NULL,
+            next_attempt INTEGER NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'pending'
+        )
+    """)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due "
+        "ON daily_outbox(status, next_attempt, id)"
+    )
+
+def migration_daily_queue(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS daily_queue_cursor (
+            user_id INTEGER PRIMARY KEY,
+            seed INTEGER,
+            pos INTEGER,
+            wrapped INTEGER
+        )
+    """)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_user_sched "
+        "ON daily_outbox(user_id, scheduled_at)"
+    )
+
+def migration_daily_mode(c):
+    add_column(c, "users", "daily_mode", "TEXT DEFAULT 'words'")
+
+# Words used to carry their part of speech inline as "word (noun)"
+def migration_part_of_speech(c):
+    for table in ("words", "personal_words"):
+        add_column(c, table, "pos", "TEXT")
+        c.execute(f"""
+            UPDATE {table} SET
+                pos = lower(trim(substr(word, instr(word, '(') + 1,
+                                        instr(word, ')') - instr(word, '(') - 1))),
+                word = trim(substr(word, 1, instr(word, '(') - 1))
+            WHERE pos IS NULL
+              AND instr(word, '(') > 1
+              AND instr(word, ')') > instr(word, '(')
+        """)
+        c.execute(f"UPDATE {table} SET pos = NULL WHERE pos IN ('', 'none')")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_words_level_pos_shuffle ON words(level, pos, shuffle_key)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_words_level_shuffle ON words(level, shuffle_key)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_words_pos_shuffle ON words(pos, shuffle_key)")
+
+# Seen state lives in word_cursor (seed + position in the shuffle), which is
+# one row per user. sent_words held a row per (user, word) and is no longer
+# read or written.
+def migration_drop_sent_words(c):
+    c.execute("DROP TABLE IF EXISTS sent_words")
+
+def migration_offline_dictionary(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS offline_dict (
+            word_key TEXT NOT NULL,
+            word TEXT,
+            pos TEXT NOT NULL DEFAULT '',
+            pronunciation TEXT,
+            definition TEXT,
+            example TEXT,
+            level TEXT,
+            source TEXT,
+            PRIMARY KEY (word_key, pos)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_offline_dict_key ON offline_dict(word_key)")
+
+# word_key is normalize_word(word): lowercased, trimmed, inner spaces
+# collapsed. Together with pos it identifies a headword, so a word can be
+# stored once per part of speech (and once per user in personal_words).
+def migration_headword_keys(c):
+    for table in ("words", "personal_words"):
+        add_column(c, table, "word_key", "TEXT")
+        rows = c.execute(f"SELECT id, word FROM {table} WHERE word_key IS NULL").fetchall()
+        c.executemany(
+            f"UPDATE {table} SET word_key = ? WHERE id = ?",
+            [(normalize_word(r["word"] or ""), r["id"]) for r in rows]
+        )
+    merge_duplicate_words(c, "words", "word_key, coalesce(pos, '')")
+    merge_duplicate_words(c, "personal_words", "user_id, word_key, coalesce(pos, '')")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_words_headword ON words(word_key, coalesce(pos, ''))")
+    c.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_personal_words_headword "
+        "ON personal_words(user_id, word_key, coalesce(pos, ''))"
+    )
+
+# Keeps the oldest row of each duplicate group, fills its empty fields from
+# the others, points queued daily words at it and drops the rest.
+def merge_duplicate_words(c, table, key):
+    groups = c.execute(f"""
+        SELECT min(id) AS keep, group_concat(id) AS ids FROM {table}
+        GROUP BY {key} HAVING count(*) > 1
+    """).fetchall()
+    for g in groups:
+        others = [int(i) for i in g["ids"].split(",") if int(i) != g["keep"]]
+        marks = ",".join("?" * len(others))
+        for col in ("topic", "definition", "example", "pronunciation", "level", "source"):
+            c.execute(f"""
+                UPDATE {table} SET {col} = (
+                    SELECT {col} FROM {table}
+                    WHERE id IN ({marks}) AND coalesce({col}, '') != ''
+                    ORDER BY id LIMIT 1
+                )
+                WHERE id = ? AND coalesce({col}, '') = ''
+            """, (*others, g["keep"]))
+        if table == "words":
+            c.execute(f"UPDATE daily_outbox SET word_id = ? WHERE word_id IN ({marks})", (g["keep"], *others))
+        c.execute(f"DELETE FROM {table} WHERE id IN ({marks})", others)
+    if groups:
+        print(f"🧹 Merged {len(groups)} duplicate groups in {table}")
+
+# Queued daily words go away with their word, so the outbox poll never has
+# to look for orphans
+def migration_outbox_word_cleanup(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_word ON daily_outbox(word_id)")
+    c.execute("DELETE FROM daily_outbox WHERE word_id NOT IN (SELECT id FROM words)")
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_words_outbox AFTER DELETE ON words
+        BEGIN
+            DELETE FROM daily_outbox WHERE word_id = OLD.id;
+        END
+    """)
+
+# A filtered daily walk only visits matching words, so it can't share a
+# cursor with the unfiltered walk without skipping the rest. Cursors are now
+# kept per (user, filter_key); existing ones are carried over to both the
+# unfiltered walk and the user's current daily filter.
+def migration_cursor_per_filter(c):
+    c.execute("""
+        CREATE TABLE word_cursor_new (
+            user_id INTEGER NOT NULL,
+            filter_key TEXT NOT NULL DEFAULT '',
+            seed INTEGER NOT NULL,
+            pos INTEGER,
+            wrapped INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, filter_key)
+        )
+    """)
+    c.execute("""
+        INSERT INTO word_cursor_new (user_id, filter_key, seed, pos, wrapped)
+        SELECT user_id, '', seed, pos, wrapped FROM word_cursor
+    """)
+    c.execute("""
+        INSERT OR IGNORE INTO word_cursor_new (user_id, filter_key, seed, pos, wrapped)
+        SELECT w.user_id, coalesce(u.daily_level, '') || '|' || coalesce(u.daily_pos, ''),
+               w.seed, w.pos, w.wrapped
+        FROM word_cursor w JOIN users u ON u.user_id = w.user_id
+        WHERE coalesce(u.daily_level, '') != '' OR coalesce(u.daily_pos, '') != ''
+    """)
+    c.execute("DROP TABLE word_cursor")
+    c.execute("ALTER TABLE word_cursor_new RENAME TO word_cursor")
+    add_column(c, "daily_queue_cursor", "filter_key", "TEXT NOT NULL DEFAULT ''")
+    c.execute("""
+        UPDATE daily_queue_cursor SET filter_key = (
+            SELECT coalesce(u.daily_level, '') || '|' || coalesce(u.daily_pos, '')
+            FROM users u WHERE u.user_id = daily_queue_cursor.user_id
+              AND (coalesce(u.daily_level, '') != '' OR coalesce(u.daily_pos, '') != '')
+        )
+        WHERE user_id IN (
+            SELECT user_id FROM users
+            WHERE coalesce(daily_level, '') != '' OR coalesce(daily_pos, '') != ''
+        )
+    """)
+
+# Dictionaries imported before POS_NAMES kept kaikki's short tags. Where the
+# full name is already there (from another import) the two rows are merged.
+def migration_offline_pos_names(c):
+    for short, name in POS_NAMES.items():
+        c.execute("""
+            UPDATE offline_dict SET
+                pronunciation = coalesce(pronunciation, (SELECT s.pronunciation FROM offline_dict s
+                    WHERE s.word_key = offline_dict.word_key AND s.pos = :short)),
+                definition = coalesce(definition, (SELECT s.definition FROM offline_dict s
+                    WHERE s.word_key = offline_dict.word_key AND s.pos = :short)),
+                example = coalesce(example, (SELECT s.example FROM offline_dict s
+                    WHERE s.word_key = offline_dict.word_key AND s.pos = :short)),
+                level = coalesce(level, (SELECT s.level FROM offline_dict s
+                    WHERE s.word_key = offline_dict.word_key AND s.pos = :short))
+            WHERE pos = :name
+              AND word_key IN (SELECT word_key FROM offline_dict WHERE pos = :short)
+        """, {"short": short, "name": name})
+        c.execute("UPDATE OR IGNORE offline_dict SET pos = ? WHERE pos = ?", (name, short))
+        c.execute("DELETE FROM offline_dict WHERE pos = ?", (short,))
+
+MIGRATIONS = [
+    migration_shuffle_cursor,
+    migration_user_timezones,
+    migration_lookup_caches,
+    migration_list_indexes,
+    migration_user_active,
+    migration_daily_outbox,
+    migration_daily_queue,
+    migration_daily_mode,
+    migration_part_of_speech,
+    migration_drop_sent_words,
+    migration_offline_dictionary,
+    migration_headword_keys,
+    migration_outbox_word_cleanup,
+    migration_cursor_per_filter,
+    migration_offline_pos_names,
+]
+
+def migrate(c):
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        c.execute("BEGIN")
+        try:
+            step(c)
+            c.execute(f"PRAGMA user_version = {number}")
+            c.commit()
+        except:
+            c.rollback()
+            raise
+        print(f"🛠 Database migrated to version {number} ({step.__name__})")
 
 # ============= Above AI =============
 def empty_word_data(word):
@@ -106,13 +494,73 @@ def empty_word_data(word):
     }
 
 
-def scrape_cambridge(word):
-    url = f"https://dictionary.cambridge.org/dictionary/english/{word}"
-    r = requests.get(url, headers=HEADERS)
-    if r.status_code != 200:
-        return None
-
-    soup = BeautifulSoup(r.text, "html.parser")
+# ============= HTTP =============
+# One keep-alive pool shared by every lookup. Each host also gets its own
+# semaphore so a burst of lookups can't flood one dictionary site.
+_http_client = None
+_host_limits = {}
+
+def http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=HTTP_TIMEOUT,
+            limits=HTTP_LIMITS,
+            follow_redirects=True
+        )
+    return _http_client
+
+async def close_http_client(app=None):
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def fetch_page(url):
+    host = httpx.URL(url).host
+    limit = _host_limits.setdefault(host, asyncio.Semaphore(HTTP_PER_HOST))
+    r = None
+    async with limit:
+        for attempt in range(HTTP_RETRIES):
+            try:
+                r = await http_client().get(url)
+                if r.status_code < 500 and r.status_code != 429:
+                    return r
+            except httpx.TransportError as e:
+                print(f"❌ Fetch failed ({attempt + 1}/{HTTP_RETRIES}) {url}: {e}")
+                r = None
+            if attempt < HTTP_RETRIES - 1:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    return r
+
+# ============= Scrapers =============
+# A scraper returns parsed data, or None when the site has no entry. It
+# raises ScrapeError when the site itself failed, so routing can tell a
+# miss from an outage.
+class ScrapeError(Exception):
+    pass
+
+def check_response(r):
+    if r is None:
+        raise ScrapeError("no response")
+    if r.status_code >= 500 or r.status_code == 429:
+        raise ScrapeError(f"HTTP {r.status_code}")
+
+# Dictionary pages are hundreds of KB but we read five elements. The
+# strainer keeps only tags carrying one of the classes the selectors need
+# (with their subtrees, in document order), so select_one still finds the
+# same first match while the tree stays tiny. lxml gets the raw bytes and
+# works out the encoding itself.
+def class_strainer(*classes):
+    wanted = set(classes)
+    return SoupStrainer(class_=lambda value: value is not None and not wanted.isdisjoint(value.split()))
+
+CAMBRIDGE_STRAINER = class_strainer("dpos", "epp-xref", "ddef_d", "dexamp", "ipa")
+WEBSTER_STRAINER = class_strainer("important-blue-link", "has-sn", "ex-sent", "pr")
+
+def parse_cambridge(word, html, encoding=None):
+    soup = BeautifulSoup(html, "lxml", parse_only=CAMBRIDGE_STRAINER, from_encoding=encoding)
 
     try:
         data = empty_word_data(word)
@@ -144,13 +592,18 @@ def scrape_cambridge(word):
         return None
 
 
-def scrape_webster(word):
-    url = f"https://www.merriam-webster.com/dictionary/{word}"
-    r = requests.get(url, headers=HEADERS)
+async def scrape_cambridge(word):
+    r = await fetch_page(CAMBRIDGE_URL.format(word))
+    check_response(r)
     if r.status_code != 200:
         return None
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    # Parsing is CPU-bound, keep it off the event loop
+    return await asyncio.to_thread(parse_cambridge, word, r.content, r.charset_encoding)
+
+
+def parse_webster(word, html, encoding=None):
+    soup = BeautifulSoup(html, "lxml", parse_only=WEBSTER_STRAINER, from_encoding=encoding)
 
     try:
         data = empty_word_data(word)
@@ -178,15 +631,24 @@ def scrape_webster(word):
         return None
 
 
-def scrape_oxford(word):
+async def scrape_webster(word):
+    r = await fetch_page(WEBSTER_URL.format(word))
+    check_response(r)
+    if r.status_code != 200:
+        return None
+
+    return await asyncio.to_thread(parse_webster, word, r.content, r.charset_encoding)
+
+
+async def scrape_oxford(word):
     return None
 
 
-def scrape_collins(word):
+async def scrape_collins(word):
     return None
 
 
-def scrape_longman(word):
+async def scrape_longman(word):
     return None
 
 
@@ -199,15 +661,353 @@ SCRAPERS = [
 ]
 
 
-def get_word_from_web(word):
-    for scraper in SCRAPERS:
-        data = scraper(word)
-        if data and any(data.values()):
+# ============= Scrape Cache =============
+# Parsed results (and misses, stored as NULL data) are kept per word and
+# source. Entries expire after their TTL and the least recently used ones
+# are dropped once the table grows past SCRAPE_CACHE_MAX.
+CACHE_STATS = {"hits": 0, "misses": 0, "ai_hits": 0, "ai_misses": 0, "offline_hits": 0}
+_cache_writes = 0
+
+def normalize_word(word):
+    return " ".join(word.lower().split())
+
+SCRAPE_CACHE_SQL = "SELECT data, fetched_at FROM scrape_cache WHERE word_key=? AND source=?"
+
+def cache_get(word, source):
+    with db() as c:
+        row = c.execute(SCRAPE_CACHE_SQL, (normalize_word(word), source)).fetchone()
+        if row:
+            ttl = SCRAPE_CACHE_TTL if row["data"] else SCRAPE_CACHE_NEGATIVE_TTL
+            if now_ts() - row["fetched_at"] < ttl:
+                c.execute(
+                    "UPDATE scrape_cache SET last_used=? WHERE word_key=? AND source=?",
+                    (int(now_ts()), normalize_word(word), source)
+                )
+                CACHE_STATS["hits"] += 1
+                return True, json.loads(row["data"]) if row["data"] else None
+    CACHE_STATS["misses"] += 1
+    return False, None
+
+def cache_put(word, source, data):
+    global _cache_writes
+    ts = int(now_ts())
+    with db() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO scrape_cache (word_key, source, data, fetched_at, last_used) VALUES (?,?,?,?,?)",
+            (normalize_word(word), source, json.dumps(data) if data else None, ts, ts)
+        )
+    _cache_writes += 1
+    if _cache_writes % 100 == 0:
+        trim_scrape_cache()
+
+def trim_scrape_cache():
+    with db() as c:
+        c.execute(
+            "DELETE FROM scrape_cache WHERE fetched_at < ?",
+            (int(now_ts()) - SCRAPE_CACHE_TTL,)
+        )
+        extra = c.execute("SELECT COUNT(*) FROM scrape_cache").fetchone()[0] - SCRAPE_CACHE_MAX
+        if extra > 0:
+            c.execute("""
+                DELETE FROM scrape_cache WHERE rowid IN (
+                    SELECT rowid FROM scrape_cache ORDER BY last_used LIMIT ?
+                )
+            """, (extra,))
+
+
+# ============= Offline Dictionary =============
+# A local copy of an openly licensed dictionary, checked before any site is
+# scraped. Load it with:
+#   python lingo.py import-dict <file> [source name]
+# The file is either a Wiktextract/kaikki.org JSONL dump or a CSV/TSV with a
+# header naming word, pos, ipa, definition, example and level columns. The
+# first sense per (word, part of speech) is kept; later imports only fill
+# in what it lacks, so a CEFR list can add levels on top of a full dump.
+OFFLINE_IMPORT_BATCH = 5000
+
+# Wiktextract's short POS tags, spelled the way the rest of the bot (and the
+# daily filter) spells them
+POS_NAMES = {
+    "adj": "adjective",
+    "adv": "adverb",
+    "name": "proper noun",
+    "num": "numeral",
+    "pron": "pronoun",
+    "prep": "preposition",
+    "prep_phrase": "prepositional phrase",
+    "conj": "conjunction",
+    "intj": "interjection",
+    "det": "determiner",
+    "abbrev": "abbreviation",
+}
+
+def pos_name(pos):
+    pos = (pos or "").strip().lower()
+    return POS_NAMES.get(pos, pos)
+
+OFFLINE_LOOKUP_SQL = """
+    SELECT word, pos, pronunciation, definition, example, level, source FROM offline_dict
+    WHERE word_key=? ORDER BY rowid LIMIT 1
+"""
+
+def offline_lookup(word):
+    row = db().execute(OFFLINE_LOOKUP_SQL, (normalize_word(word),)).fetchone()
+    if not row:
+        return None
+    CACHE_STATS["offline_hits"] += 1
+    data = empty_word_data(word)
+    data.update(
+        parts=row["pos"] or None,
+        level=row["level"],
+        definition=row["definition"],
+        example=row["example"],
+        pronunciation=row["pronunciation"],
+        source=row["source"],
+    )
+    return data
+
+def kaikki_entry(line):
+    entry = json.loads(line)
+    if entry.get("lang_code", "en") != "en":
+        return None
+    sense = next((s for s in entry.get("senses", []) if s.get("glosses")), None)
+    if not entry.get("word") or not sense:
+        return None
+    example = next((e.get("text") for e in sense.get("examples", []) if e.get("text")), None)
+    ipa = next((s["ipa"] for s in entry.get("sounds", []) if s.get("ipa")), None)
+    return entry["word"], entry.get("pos"), ipa, sense["glosses"][0], example, None
+
+def table_entries(f, delimiter):
+    for row in csv.DictReader(f, delimiter=delimiter):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        word = row.get("word") or row.get("headword")
+        if word:
+            yield (
+                word,
+                row.get("pos") or row.get("part_of_speech"),
+                row.get("ipa") or row.get("pronunciation"),
+                row.get("definition"),
+                row.get("example"),
+                row.get("level") or row.get("cefr"),
+            )
+
+def dictionary_entries(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                entry = kaikki_entry(line) if line.strip() else None
+                if entry:
+                    yield entry
+        else:
+            yield from table_entries(f, "\t" if path.endswith(".tsv") else ",")
+
+def import_dictionary(path, source="Offline"):
+    init_db()
+    c = db()
+    batch, total = [], 0
+
+    def flush():
+        with c:
+            c.executemany(
+                """
+                INSERT INTO offline_dict
+                    (word_key, word, pos, pronunciation, definition, example, level, source)
+                VALUES (?,?,?,?,?,?,?,?)
+                ON CONFLICT(word_key, pos) DO UPDATE SET
+                    pronunciation = coalesce(pronunciation, excluded.pronunciation),
+                    example = coalesce(example, excluded.example),
+                    level = coalesce(level, excluded.level)
+                """,
+                batch
+            )
+        batch.clear()
+
+    for word, pos, ipa, definition, example, level in dictionary_entries(path):
+        batch.append((
+            normalize_word(word), word, pos_name(pos),
+            ipa or None, definition or None, example or None, level or None, source
+        ))
+        total += 1
+        if len(batch) >= OFFLINE_IMPORT_BATCH:
+            flush()
+    if batch:
+        flush()
+
+    entries = c.execute("SELECT COUNT(*) FROM offline_dict").fetchone()[0]
+    print(f"📚 Imported {total} entries from {path} ({entries} in offline dictionary)")
+
+def cache_get_sources(word, sources):
+    return {source: cache_get(word, source) for source in sources}
+
+# ============= Scraper Routing =============
+# Every live lookup records its outcome and latency per source. Sources are
+# tried best first (most likely to find the word per second spent), and one
+# that keeps failing is skipped by a circuit breaker until its cooldown
+# passes, then let through for a single probe. When the running source is
+# still busy after SCRAPE_HEDGE_AFTER, the next one starts alongside it. The
+# first source that returns data wins and the rest are cancelled.
+SOURCE_STATS = {}
+
+def source_stats(name):
+    return SOURCE_STATS.setdefault(name, {
+        "found": 0,
+        "empty": 0,
+        "failed": 0,
+        "latencies": deque(maxlen=50),
+        "streak": 0,
+        "open_until": 0,
+        "cooldown": BREAKER_COOLDOWN,
+        "probing": False,
+    })
+
+def source_score(name):
+    s = source_stats(name)
+    tries = s["found"] + s["empty"] + s["failed"]
+    found_rate = (s["found"] + 1) / (tries + 2)
+    latencies = sorted(s["latencies"])
+    latency = latencies[len(latencies) // 2] if latencies else 1.0
+    return max(latency, 0.1) / found_rate
+
+def breaker_open(name):
+    s = source_stats(name)
+    if s["streak"] < BREAKER_FAILURES:
+        return False
+    if now_ts() < s["open_until"] or s["probing"]:
+        return True
+    s["probing"] = True
+    return False
+
+def record_source(name, outcome, elapsed):
+    s = source_stats(name)
+    s[outcome] += 1
+    s["latencies"].append(elapsed)
+    s["probing"] = False
+    if outcome == "failed":
+        s["streak"] += 1
+        if s["streak"] >= BREAKER_FAILURES:
+            s["open_until"] = now_ts() + s["cooldown"]
+            print(f"⚡ {name} breaker open for {s['cooldown']}s")
+            s["cooldown"] = min(s["cooldown"] * 2, BREAKER_MAX_COOLDOWN)
+    else:
+        s["streak"] = 0
+        s["cooldown"] = BREAKER_COOLDOWN
+
+async def run_scraper(scraper, word):
+    name = scraper.__name__
+    started = perf_counter()
+    try:
+        data = await scraper(word)
+    except asyncio.CancelledError:
+        # Lost a hedge: the time it had taken so far still counts against it
+        s = source_stats(name)
+        s["latencies"].append(perf_counter() - started)
+        s["probing"] = False
+        raise
+    except Exception as e:
+        record_source(name, "failed", perf_counter() - started)
+        print(f"❌ {name} failed for {word}: {e}")
+        return scraper, "failed", None
+
+    if not (data and any(data.values())):
+        data = None
+    record_source(name, "found" if data else "empty", perf_counter() - started)
+    return scraper, "found" if data else "empty", data
+
+async def get_word_from_web(word):
+    data = await db_read(offline_lookup, word)
+    if data:
+        return data
+
+    ranked = sorted(SCRAPERS, key=lambda s: source_score(s.__name__))
+    cached = await db_write(cache_get_sources, word, [s.__name__ for s in ranked])
+
+    for scraper in ranked:
+        hit, data = cached[scraper.__name__]
+        if hit and data:
+            data["word"] = word
             return data
+
+    # Breakers are checked only when a source is about to start, so a
+    # half-open source is never marked as probing without being tried
+    waiting = deque(s for s in ranked if not cached[s.__name__][0])
+    running = set()
+    result = None
+    try:
+        # Each pass starts the next source: at first, after a source came
+        # back empty-handed, or after the hedge delay ran out
+        while waiting or running:
+            while waiting:
+                scraper = waiting.popleft()
+                if not breaker_open(scraper.__name__):
+                    running.add(asyncio.create_task(run_scraper(scraper, word)))
+                    break
+            if not running:
+                break
+            done, running = await asyncio.wait(
+                running,
+                timeout=SCRAPE_HEDGE_AFTER if waiting else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                scraper, outcome, data = task.result()
+                # Outages are not cached, only real answers and misses
+                if outcome != "failed":
+                    await db_write(cache_put, word, scraper.__name__, data)
+                if data and result is None:
+                    result = data
+            if result:
+                break
+    finally:
+        for task in running:
+            task.cancel()
+
+    if result:
+        result["word"] = word
+        return result
     return empty_word_data(word)
 
+def source_summary():
+    lines = []
+    for scraper in sorted(SCRAPERS, key=lambda s: source_score(s.__name__)):
+        name = scraper.__name__
+        s = source_stats(name)
+        tries = s["found"] + s["empty"] + s["failed"]
+        state = " ⚡ open" if s["streak"] >= BREAKER_FAILURES else ""
+        lines.append(
+            f"{name.replace('scrape_', '')}: {s['found']}/{tries} found, "
+            f"{s['failed']} failed, {latency_summary(s['latencies'])}{state}"
+        )
+    return "\n".join(lines)
+
 # ================= AI =================
-def ai_generate_full_word(word: str):
+# Every Groq call goes through ai_complete, which records its latency.
+# Handlers that wait on AI run it through run_cancellable so /cancel can stop
+# the wait.
+AI_LATENCIES = deque(maxlen=200)
+AI_TASKS = {}  # user id -> running AI task
+
+async def ai_complete(prompt):
+    started = perf_counter()
+    try:
+        r = await client.chat.completions.create(
+            model=AI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+        )
+        return r.choices[0].message.content
+    finally:
+        AI_LATENCIES.append(perf_counter() - started)
+
+async def run_cancellable(uid, coro):
+    task = asyncio.create_task(coro)
+    AI_TASKS[uid] = task
+    try:
+        return await task
+    finally:
+        if AI_TASKS.get(uid) is task:
+            del AI_TASKS[uid]
+
+async def ai_generate_full_word(word: str):
     prompt = f"""
 You are an English linguist.
 
@@ -228,15 +1028,78 @@ PRONUNCIATION:
 SOURCE:
 ---
 """
-    r = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
-    return r.choices[0].message.content.strip()
+    return (await ai_complete(prompt)).strip()
+
+# ============= AI cache =============
+# Completions are stored under a hash of everything that shapes the answer.
+# If the same key is already being fetched, callers wait on that request
+# instead of sending their own. The shared request is cancelled only when
+# every waiter has gone away.
+_ai_inflight = {}  # key -> [task, waiters]
+
+def ai_cache_key(word, missing):
+    raw = json.dumps([AI_MODEL, AI_PROMPT_VERSION, normalize_word(word), sorted(missing)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+AI_CACHE_SQL = "SELECT response FROM ai_cache WHERE key=?"
+
+def ai_cache_lookup(key):
+    with db() as c:
+        row = c.execute(AI_CACHE_SQL, (key,)).fetchone()
+    return row["response"] if row else None
+
+def ai_cache_store(key, text):
+    with db() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO ai_cache (key, response, created_at) VALUES (?,?,?)",
+            (key, text, int(now_ts()))
+        )
+
+async def complete_and_store(key, prompt):
+    text = await ai_complete(prompt)
+    await db_write(ai_cache_store, key, text)
+    return text
+
+async def cached_completion(key, prompt):
+    text = await db_read(ai_cache_lookup, key)
+    if text is not None:
+        CACHE_STATS["ai_hits"] += 1
+        return text
+
+    entry = _ai_inflight.get(key)
+    if entry is None:
+        CACHE_STATS["ai_misses"] += 1
+        entry = _ai_inflight[key] = [asyncio.create_task(complete_and_store(key, prompt)), 0]
+        entry[0].add_done_callback(lambda t: drop_inflight(key, entry))
+    else:
+        CACHE_STATS["ai_hits"] += 1
+
+    entry[1] += 1
+    try:
+        return await asyncio.shield(entry[0])
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and not entry[0].done():
+            # Forget it right away so a new caller starts a fresh request
+            # instead of joining the one being cancelled
+            drop_inflight(key, entry)
+            entry[0].cancel()
+
+def drop_inflight(key, entry):
+    if _ai_inflight.get(key) is entry:
+        del _ai_inflight[key]
+
+def apply_ai_lines(data, text):
+    for line in text.splitlines():
+        if ":" in line:
+            k, v = line.split(":", 1)
+            k = k.strip()
+            if k in data and data[k] is None:
+                data[k] = v.strip()
+    return data
 
 # ============= AI fill missing =============
-def ai_fill_missing(data):
+async def ai_fill_missing(data):
     missing = [k for k, v in data.items() if v is None]
 
     if not missing:
@@ -252,20 +1115,95 @@ Current data: {data}
 Return only key:value lines.
 """
 
-    r = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
+    text = await cached_completion(ai_cache_key(data["word"], missing), prompt)
+    return apply_ai_lines(data, text)
+
+# ============= AI fill missing (batch) =============
+# Up to AI_BATCH_SIZE words share one request. The answer is a JSON array
+# that is mapped back by word. Each word's slice is also cached under its
+# single-word key, and any word the model left out goes through
+# ai_fill_missing on its own.
+def parse_ai_batch(text):
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+
+    answers = {}
+    for obj in items if isinstance(items, list) else []:
+        if isinstance(obj, dict) and isinstance(obj.get("word"), str):
+            answers[normalize_word(obj["word"])] = obj
+    return answers
+
+async def ai_batch_request(batch):
+    records = [
+        {k: v for k, v in data.items() if v is not None or k in missing}
+        for data, missing in batch
+    ]
+    prompt = f"""
+Fill ONLY the missing (null) fields for each word below.
+Do not change existing data.
 
-    for line in r.choices[0].message.content.splitlines():
-        if ":" in line:
-            k, v = line.split(":", 1)
-            k = k.strip()
-            if k in data and data[k] is None:
-                data[k] = v.strip()
+Return ONLY a JSON array with one object per word, in the same order.
+Each object must have "word" plus the missing keys. No other text.
 
-    return data
+Words:
+{json.dumps(records, ensure_ascii=False)}
+"""
+    return parse_ai_batch(await ai_complete(prompt))
+
+async def ai_fill_missing_one(data):
+    try:
+        await ai_fill_missing(data)
+    except Exception as e:
+        print(f"❌ AI fill failed for {data['word']}: {e}")
+
+async def ai_fill_batch(batch):
+    try:
+        answers = await ai_batch_request(batch)
+        CACHE_STATS["ai_misses"] += 1
+    except Exception as e:
+        print(f"❌ AI batch failed: {e}")
+        answers = {}
+
+    retry = []
+    for data, missing in batch:
+        obj = answers.get(normalize_word(data["word"]))
+        text = "\n".join(
+            f"{k}: {obj[k]}" for k in missing
+            if obj.get(k) not in (None, "")
+        ) if isinstance(obj, dict) else ""
+        if not text:
+            # Nothing usable for this word: ask for it on its own rather than
+            # caching an empty answer forever
+            retry.append(data)
+            continue
+        await db_write(ai_cache_store, ai_cache_key(data["word"], missing), text)
+        apply_ai_lines(data, text)
+
+    await asyncio.gather(*(ai_fill_missing_one(data) for data in retry))
+
+async def ai_fill_missing_batch(items):
+    pending = []
+    for data in items:
+        missing = [k for k, v in data.items() if v is None]
+        if not missing:
+            continue
+        cached = await db_read(ai_cache_lookup, ai_cache_key(data["word"], missing))
+        if cached is not None:
+            CACHE_STATS["ai_hits"] += 1
+            apply_ai_lines(data, cached)
+        else:
+            pending.append((data, missing))
+
+    await asyncio.gather(*(
+        ai_fill_batch(pending[i:i + AI_BATCH_SIZE])
+        for i in range(0, len(pending), AI_BATCH_SIZE)
+    ))
+    return items
 
 # ================= KEYBOARDS =================
 def main_keyboard_bottom(is_admin=False):
@@ -310,18 +1248,9 @@ async def send_word(chat, row):
         await chat.reply_text("No word found.")
         return
     
-    # Check if the word contains brackets like "word (noun)"
-    word_text = row['word']
-    if '(' in word_text and ')' in word_text:
-        part_of_speech = word_text.split('(')[-1].replace(')', '')
-        display_word = word_text.split('(')[0].strip()
-    else:
-        part_of_speech = "Not specified"
-        display_word = word_text
-
     text = (
-        f"Word: {display_word}\n"
-        f"Part of Speech: {part_of_speech}\n"
+        f"Word: {row['word']}\n"
+        f"Part of Speech: {row['pos'] or 'Not specified'}\n"
         f"Level: {row['level']}\n"
         f"Definition: {row['definition']}\n"
         f"Example: {row['example']}\n"
@@ -330,35 +1259,101 @@ async def send_word(chat, row):
     )
     await chat.reply_text(text, parse_mode="Markdown")
 
-def pick_word_for_user(user_id):
+# Manual entries may still type "word (noun)"
+def split_pos(word_text):
+    if '(' in word_text and ')' in word_text:
+        pos = word_text.split('(')[-1].replace(')', '').strip().lower()
+        return word_text.split('(')[0].strip(), pos or None
+    return word_text.strip(), None
+
+# Each user walks the words in shuffle_key order, starting at their own random
+# seed and wrapping around once. pos is the last key handed out (NULL = none yet
+# in this half of the walk). When the walk gets back to the seed the bank is
+# exhausted and the user starts a fresh walk from a new seed. Level and
+# part-of-speech filters narrow the walk and stay on an index through the
+# (level, pos, shuffle_key) family of indexes.
+def new_seed():
+    return random.randint(-2**63 + 1, 2**63 - 1)
+
+def walk_query(seed, pos, wrapped, limit=1, level=None, part_of_speech=None):
+    filters, filter_args = "", []
+    if level:
+        filters += " AND level = ?"
+        filter_args.append(level)
+    if part_of_speech:
+        filters += " AND pos = ?"
+        filter_args.append(part_of_speech)
+
+    if not wrapped:
+        if pos is None:
+            sql, args = "shuffle_key >= ?", [seed]
+        else:
+            sql, args = "shuffle_key > ?", [pos]
+    else:
+        sql, args = "shuffle_key < ?", [seed]
+        if pos is not None:
+            sql += " AND shuffle_key > ?"
+            args.append(pos)
+    return (
+        f"SELECT * FROM words WHERE {sql}{filters} ORDER BY shuffle_key LIMIT ?",
+        (*args, *filter_args, limit)
+    )
+
+def next_in_walk(c, seed, pos, wrapped, limit=1, level=None, part_of_speech=None):
+    return c.execute(*walk_query(seed, pos, wrapped, limit, level, part_of_speech)).fetchall()
+
+CURSOR_SQL = "SELECT seed, pos, wrapped FROM word_cursor WHERE user_id=? AND filter_key=?"
+
+# Each filter combination walks with its own cursor; '' is the whole bank
+def walk_filter_key(level=None, part_of_speech=None):
+    if not (level or part_of_speech):
+        return ""
+    return f"{level or ''}|{part_of_speech or ''}"
+
+def pick_words(c, user_id, n, level=None, part_of_speech=None):
+    filter_key = walk_filter_key(level, part_of_speech)
+    cur = c.execute(CURSOR_SQL, (user_id, filter_key)).fetchone()
+    if cur:
+        seed, pos, wrapped = cur["seed"], cur["pos"], cur["wrapped"]
+    else:
+        seed, pos, wrapped = new_seed(), None, 0
+
+    words = []
+    fresh = not cur
+    while len(words) < n:
+        rows = next_in_walk(c, seed, pos, wrapped, n - len(words), level, part_of_speech)
+        if rows:
+            words.extend(rows)
+            pos = rows[-1]["shuffle_key"]
+            fresh = False
+        elif not wrapped:
+            pos, wrapped = None, 1
+        elif fresh:
+            break  # a brand-new walk found nothing: the bank is empty
+        else:
+            # Reset the walk if all words were already sent
+            seed, pos, wrapped = new_seed(), None, 0
+            fresh = True
+
+    if not words and (level or part_of_speech):
+        # Nothing matches the filters at all: fall back to the whole bank
+        return pick_words(c, user_id, n)
+
+    if words:
+        c.execute("""
+            INSERT INTO word_cursor (user_id, filter_key, seed, pos, wrapped) VALUES (?,?,?,?,?)
+            ON CONFLICT(user_id, filter_key) DO UPDATE SET
+                seed=excluded.seed, pos=excluded.pos, wrapped=excluded.wrapped
+        """, (user_id, filter_key, seed, pos, wrapped))
+    return words
+
+def pick_words_for_user(user_id, n):
     with db() as c:
-        row = c.execute("""
-            SELECT w.*
-            FROM words w
-            LEFT JOIN sent_words s
-              ON w.id = s.word_id AND s.user_id = ?
-            WHERE s.word_id IS NULL
-            ORDER BY RANDOM()
-            LIMIT 1
-        """, (user_id,)).fetchone()
-
-        if not row:
-            # Reset sent words if all words were already sent
-            c.execute("DELETE FROM sent_words WHERE user_id=?", (user_id,))
-            row = c.execute("""
-                SELECT w.*
-                FROM words w
-                ORDER BY RANDOM()
-                LIMIT 1
-            """).fetchone()
-            if not row:
-                return None
+        return pick_words(c, user_id, n)
 
-        c.execute(
-            "INSERT OR IGNORE INTO sent_words (user_id, word_id) VALUES (?,?)",
-            (user_id, row["id"])
-        )
-        return row
+def pick_word_for_user(user_id):
+    words = pick_words_for_user(user_id, 1)
+    return words[0] if words else None
 
 # ================= MAIN MENU =================
 async def main_menu_handler(update, context):
@@ -366,7 +1361,7 @@ async def main_menu_handler(update, context):
     uid = update.effective_user.id
 
     if text == "🎯 Get Word":
-        await send_word(update.message, pick_word_for_user(uid))
+        await send_word(update.message, await db_write(pick_word_for_user, uid))
         return ConversationHandler.END
 
     if text == "➕ Add Word":
@@ -401,8 +1396,7 @@ async def main_menu_handler(update, context):
         return 9
 
     if text == "🗑 Clear Words" and uid in ADMIN_IDS:
-        with db() as c:
-            c.execute("DELETE FROM words")
+        await db_write(query, "DELETE FROM words")
         await update.message.reply_text(
             "All words cleared.",
             reply_markup=main_keyboard_bottom(True)
@@ -432,11 +1426,31 @@ async def daily_count_handler(update, context):
 # Step 2 — Time
 async def daily_time_handler(update, context):
     time_text = update.message.text.strip()
-    if not re.match(r"^\d{2}:\d{2}$", time_text):
+    if not re.match(r"^([01]\d|2[0-3]):[0-5]\d$", time_text):
         await update.message.reply_text("Please enter time in HH:MM format (e.g., 09:30).")
         return DAILY_TIME
 
     context.user_data["daily_time"] = time_text
+    keyboard = ReplyKeyboardMarkup(
+        [["Asia/Tehran","UTC"],["Europe/London","Europe/Berlin"],["America/New_York","America/Los_Angeles"]],
+        resize_keyboard=True
+    )
+    await update.message.reply_text(
+        "Choose your timezone, or type one (e.g., Asia/Dubai):",
+        reply_markup=keyboard
+    )
+    return DAILY_TZ
+
+# Step 3 — Timezone
+async def daily_tz_handler(update, context):
+    tz_name = update.message.text.strip()
+    try:
+        pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        await update.message.reply_text("Unknown timezone. Please use a name like Asia/Tehran or Europe/London.")
+        return DAILY_TZ
+
+    context.user_data["timezone"] = tz_name
     keyboard = ReplyKeyboardMarkup(
         [["A1","A2","B1"],["B2","C1"],["Skip"]],
         resize_keyboard=True
@@ -444,7 +1458,7 @@ async def daily_time_handler(update, context):
     await update.message.reply_text("Choose level (optional):", reply_markup=keyboard)
     return DAILY_LEVEL
 
-# Step 3 — Level
+# Step 4 — Level
 async def daily_level_handler(update, context):
     level = update.message.text
     if level != "Skip":
@@ -458,32 +1472,50 @@ async def daily_level_handler(update, context):
     await update.message.reply_text("Choose part of speech (optional):", reply_markup=keyboard)
     return DAILY_POS
 
-# Step 4 — Part of speech + save
+# Step 5 — Part of speech
 async def daily_pos_handler(update, context):
     pos = update.message.text
     if pos != "Skip":
-        context.user_data["daily_pos"] = pos
+        context.user_data["daily_pos"] = pos.strip().lower()
     else:
         context.user_data["daily_pos"] = None
+    keyboard = ReplyKeyboardMarkup(
+        [["One message per word"],["All words in one message"]],
+        resize_keyboard=True
+    )
+    await update.message.reply_text("How should I send them?", reply_markup=keyboard)
+    return DAILY_MODE
+
+# Step 6 — Delivery mode + save
+async def daily_mode_handler(update, context):
+    if update.message.text == "All words in one message":
+        daily_mode = "digest"
+    else:
+        daily_mode = "words"
 
     uid = update.effective_user.id
     daily_count = context.user_data.get("daily_count")
     daily_time = context.user_data.get("daily_time")
     daily_level = context.user_data.get("daily_level")
     daily_pos = context.user_data.get("daily_pos")
+    tz_name = context.user_data.get("timezone", "Asia/Tehran")
+    utc_minute = to_utc_minute(daily_time, tz_name)
     
-    with db() as c:
-        c.execute("""
-            INSERT INTO users (user_id, daily_enabled, daily_count, daily_time, daily_level, daily_pos)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                daily_enabled=excluded.daily_enabled,
-                daily_count=excluded.daily_count,
-                daily_time=excluded.daily_time,
-                daily_level=excluded.daily_level,
-                daily_pos=excluded.daily_pos
-        """, (uid, 1, daily_count, daily_time, daily_level, daily_pos))
-
+    await db_write(query, """
+        INSERT INTO users (user_id, daily_enabled, daily_count, daily_time, daily_level, daily_pos, timezone, daily_utc_minute, daily_mode)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            daily_enabled=excluded.daily_enabled,
+            daily_count=excluded.daily_count,
+            daily_time=excluded.daily_time,
+            daily_level=excluded.daily_level,
+            daily_pos=excluded.daily_pos,
+            timezone=excluded.timezone,
+            daily_utc_minute=excluded.daily_utc_minute,
+            daily_mode=excluded.daily_mode
+    """, (uid, 1, daily_count, daily_time, daily_level, daily_pos, tz_name, utc_minute, daily_mode))
+    update_daily_bucket(context.job_queue, uid, utc_minute)
+    await db_write(requeue_user, uid)
 
     context.user_data.clear()
     await update.message.reply_text(
@@ -536,68 +1568,98 @@ async def save_pron(update, context):
     d = context.user_data
     uid = update.effective_user.id
     pron = update.message.text
+    word, pos = split_pos(d["word"])
 
-    with db() as c:
-        if uid in ADMIN_IDS:
-            c.execute(
-                "INSERT INTO words (topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?)",
-                (d["topic"], d["word"], d["definition"], d["example"], pron, d["level"], "Manual")
-            )
-        else:
-            c.execute(
-                "INSERT INTO personal_words (user_id, topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?,?)",
-                (uid, d["topic"], d["word"], d["definition"], d["example"], pron, d["level"], "Manual")
-            )
+    added = await db_write(save_words, uid, [{
+        "topic": d["topic"],
+        "word": word,
+        "parts": pos,
+        "definition": d["definition"],
+        "example": d["example"],
+        "pronunciation": pron,
+        "level": d["level"],
+        "source": "Manual",
+    }])
 
     context.user_data.clear()
     await update.message.reply_text(
-        "Word saved.",
+        "Word saved." if added else "This word is already saved.",
         reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
     )
     return ConversationHandler.END
 
+# Admins add to the public words, everyone else to their personal list.
+# Rows whose headword (word_key + pos) is already there are skipped by the
+# unique index; returns how many were actually inserted.
+def save_words(uid, items):
+    rows = [
+        (
+            data.get("topic") or "General",
+            " ".join(data["word"].split()),
+            normalize_word(data["word"]),
+            (data["parts"] or "").strip().lower() or None,
+            data["definition"],
+            data["example"],
+            data["pronunciation"],
+            data["level"],
+            data["source"],
+        )
+        for data in items
+    ]
+    with db() as c:
+        if uid in ADMIN_IDS:
+            # Passing shuffle_key up front spares the trigger's extra UPDATE per row
+            cur = c.executemany(
+                "INSERT OR IGNORE INTO words (topic, word, word_key, pos, definition, example, pronunciation, level, source, shuffle_key) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(*r, new_seed()) for r in rows]
+            )
+        else:
+            cur = c.executemany(
+                "INSERT OR IGNORE INTO personal_words (user_id, topic, word, word_key, pos, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(uid, *r) for r in rows]
+            )
+        return cur.rowcount
+
+# One index probe per word, run before any scraping or AI work
+PUBLIC_WORD_EXISTS_SQL = "SELECT 1 FROM words WHERE word_key=? LIMIT 1"
+PERSONAL_WORD_EXISTS_SQL = "SELECT 1 FROM personal_words WHERE user_id=? AND word_key=? LIMIT 1"
+
+def existing_words(uid, words):
+    c = db()
+    if uid in ADMIN_IDS:
+        sql, args = PUBLIC_WORD_EXISTS_SQL, ()
+    else:
+        sql, args = PERSONAL_WORD_EXISTS_SQL, (uid,)
+    return {w for w in words if c.execute(sql, (*args, normalize_word(w))).fetchone()}
+
 async def ai_add(update, context):
     uid = update.effective_user.id
     word = update.message.text.strip()
 
-    # Step 1: Scrape websites first
-    data = get_word_from_web(word)
+    if await db_read(existing_words, uid, [word]):
+        await update.message.reply_text(
+            "This word is already saved.",
+            reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
+        )
+        return ConversationHandler.END
+
+    async def enrich():
+        # Step 1: Scrape websites first
+        data = await get_word_from_web(word)
 
-    # Step 2: Fill only missing fields with AI
-    data = ai_fill_missing(data)
+        # Step 2: Fill only missing fields with AI
+        return await ai_fill_missing(data)
+
+    try:
+        data = await run_cancellable(uid, enrich())
+    except asyncio.CancelledError:
+        return ConversationHandler.END
 
     # Step 3: Save to DB
-    with db() as c:
-        if uid in ADMIN_IDS:
-            c.execute(
-                "INSERT INTO words (topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?)",
-                (
-                    "General",
-                    f"{data['word']} ({data['parts']})",
-                    data["definition"],
-                    data["example"],
-                    data["pronunciation"],
-                    data["level"],
-                    data["source"],
-                )
-            )
-        else:
-            c.execute(
-                "INSERT INTO personal_words (user_id, topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?,?)",
-                (
-                    uid,
-                    "General",
-                    f"{data['word']} ({data['parts']})",
-                    data["definition"],
-                    data["example"],
-                    data["pronunciation"],
-                    data["level"],
-                    data["source"],
-                )
-            )
+    added = await db_write(save_words, uid, [data])
 
     await update.message.reply_text(
-        "Word added (Dictionary + AI).",
+        "Word added (Dictionary + AI)." if added else "This word is already saved.",
         reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
     )
     return ConversationHandler.END
@@ -615,7 +1677,8 @@ async def bulk_add_choice(update, context):
 
     if text == "Manual":
         await update.message.reply_text(
-            "Send lines:\ntopic | level | word | definition | example | pronunciation"
+            "Send lines:\ntopic | level | word | definition | example | pronunciation\n\n"
+            "Or upload a CSV/TSV file with the same columns (a header row is optional)."
         )
         return 11
 
@@ -625,66 +1688,215 @@ async def bulk_add_choice(update, context):
 
     return 10
 
+BULK_COLUMNS = ["topic", "level", "word", "definition", "example", "pronunciation"]
+
+def bulk_item(topic, level, word, definition, example, pron, pos=None):
+    word, word_pos = split_pos(word)
+    return {
+        "topic": topic,
+        "word": word,
+        "parts": pos or word_pos,
+        "definition": definition,
+        "example": example,
+        "pronunciation": pron,
+        "level": level,
+        "source": "Bulk",
+    }
+
 async def bulk_add_manual(update, context):
     lines = update.message.text.splitlines()
-    with db() as c:
-        for l in lines:
-            p = [x.strip() for x in l.split("|")]
-            if len(p) == 6:
-                c.execute(
-                    "INSERT INTO words (topic, level, word, definition, example, pronunciation, source) VALUES (?,?,?,?,?,?,?)",
-                    (*p, "Bulk")
-                )
+
+    items = []
+    for l in lines:
+        p = [x.strip() for x in l.split("|")]
+        if len(p) == 6:
+            items.append(bulk_item(*p))
+
+    added = await db_write(save_words, update.effective_user.id, items)
     await update.message.reply_text(
-        "Bulk manual add done.",
+        f"Bulk manual add done.\nAdded: {added}\nAlready saved: {len(items) - added}",
         reply_markup=main_keyboard_bottom(True)
     )
     return ConversationHandler.END
 
 async def bulk_add_ai(update, context):
     uid = update.effective_user.id
-    words = [w.strip() for w in update.message.text.splitlines() if w.strip()]
+    seen, words = set(), []
+    for line in update.message.text.splitlines():
+        if line.strip() and normalize_word(line) not in seen:
+            seen.add(normalize_word(line))
+            words.append(line.strip())
+
+    # Words already saved never reach the network
+    existing = await db_read(existing_words, uid, words)
+    words = [w for w in words if w not in existing]
+
+    # Scrape up to BULK_CONCURRENCY words at a time, fill the gaps with
+    # batched AI requests, then one insert
+    limit = asyncio.Semaphore(BULK_CONCURRENCY)
+    done = 0
+
+    async def lookup(word):
+        nonlocal done
+        async with limit:
+            try:
+                data = await get_word_from_web(word)
+            except Exception as e:
+                print(f"❌ Bulk lookup failed for {word}: {e}")
+                data = None
+
+        done += 1
+        if done % BULK_PROGRESS_EVERY == 0 and done < len(words):
+            await update.message.reply_text(f"⏳ {done}/{len(words)} words looked up...")
+        return data
 
-    with db() as c:
-        for word in words:
-            data = get_word_from_web(word)
-            data = ai_fill_missing(data)
+    async def enrich():
+        results = await asyncio.gather(*(lookup(w) for w in words))
+        await ai_fill_missing_batch([d for d in results if d])
+        return results
 
-            if uid in ADMIN_IDS:
-                c.execute(
-                    "INSERT INTO words (topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?)",
-                    (
-                        "General",
-                        f"{data['word']} ({data['parts']})",
-                        data["definition"],
-                        data["example"],
-                        data["pronunciation"],
-                        data["level"],
-                        data["source"],
-                    )
-                )
-            else:
-                c.execute(
-                    "INSERT INTO personal_words (user_id, topic, word, definition, example, pronunciation, level, source) VALUES (?,?,?,?,?,?,?,?)",
-                    (
-                        uid,
-                        "General",
-                        f"{data['word']} ({data['parts']})",
-                        data["definition"],
-                        data["example"],
-                        data["pronunciation"],
-                        data["level"],
-                        data["source"],
-                    )
-                )
+    try:
+        results = await run_cancellable(uid, enrich())
+    except asyncio.CancelledError:
+        return ConversationHandler.END
 
+    added = [d for d in results if d and d["definition"]]
+    failed = [w for w, d in zip(words, results) if not (d and d["definition"])]
+
+    saved = await db_write(save_words, uid, added) if added else 0
+
+    report = (
+        f"Bulk AI add done (Dictionary + AI).\nAdded: {saved}\n"
+        f"Already saved: {len(existing) + len(added) - saved}\nFailed: {len(failed)}"
+    )
+    if failed:
+        report += "\n\n" + "\n".join(failed)
     await update.message.reply_text(
-        "Bulk AI add done (Dictionary + AI).",
+        report[:4096],
         reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
     )
     return ConversationHandler.END
 
+# ============= Bulk File Import =============
+# An uploaded CSV/TSV is saved to a temp file and read row by row on a worker
+# thread, so the file is never held in memory. Every IMPORT_BATCH rows go to
+# the writer thread as one executemany transaction, leaving the writer free
+# for other work in between. Columns follow BULK_COLUMNS unless the first
+# non-empty row is a header naming them (a "pos" column is also understood).
+def sniff_delimiter(path, first_line):
+    if path.endswith(".tsv"):
+        return "\t"
+    return max(",\t|;", key=first_line.count)
+
+def import_word_file(uid, path, filename):
+    stats = {"rows": 0, "added": 0, "errors": 0}
+    errors = []
+    batch = []
+
+    def flush():
+        stats["added"] += _db_writer.submit(save_words, uid, batch).result()
+        batch.clear()
+
+    def error(line, reason):
+        stats["errors"] += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append(f"Line {line}: {reason}")
+
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        first_line = next((line for line in f if line.strip()), "")
+        delimiter = sniff_delimiter(filename, first_line)
+        f.seek(0)
+        reader = csv.reader(f, delimiter=delimiter)
+        columns = None
+        for row in reader:
+            cells = [x.strip() for x in row]
+            if not any(cells):
+                continue
+            if columns is None:
+                columns = BULK_COLUMNS
+                if "word" in [x.lower() for x in cells]:
+                    columns = [x.lower() for x in cells]
+                    continue
+
+            stats["rows"] += 1
+            if len(cells) != len(columns):
+                error(reader.line_num, f"expected {len(columns)} columns, got {len(cells)}")
+                continue
+            fields = dict(zip(columns, cells))
+            if not fields.get("word"):
+                error(reader.line_num, "word is empty")
+                continue
+            if not fields.get("definition"):
+                error(reader.line_num, "definition is empty")
+                continue
+
+            batch.append(bulk_item(
+                fields.get("topic") or "General",
+                fields.get("level") or None,
+                fields["word"],
+                fields["definition"],
+                fields.get("example") or None,
+                fields.get("pronunciation") or None,
+                (fields.get("pos") or "").lower() or None,
+            ))
+            if len(batch) >= IMPORT_BATCH:
+                flush()
+    if batch:
+        flush()
+    return stats, errors
+
+async def bulk_add_document(update, context):
+    uid = update.effective_user.id
+    document = update.message.document
+    name = (document.file_name or "").lower()
+    if not name.endswith((".csv", ".tsv", ".txt")):
+        await update.message.reply_text("Please upload a .csv or .tsv file.")
+        return 11
+
+    status = await update.message.reply_text("⏳ Importing...")
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+    os.close(fd)
+    try:
+        started = perf_counter()
+        await (await document.get_file()).download_to_drive(path)
+        stats, errors = await asyncio.to_thread(import_word_file, uid, path, name)
+    except Exception as e:
+        await status.edit_text(f"❌ Import failed: {e}")
+        return ConversationHandler.END
+    finally:
+        os.remove(path)
+
+    valid = stats["rows"] - stats["errors"]
+    report = (
+        f"Bulk file import done in {perf_counter() - started:.1f}s.\n"
+        f"Rows: {stats['rows']}\n"
+        f"Added: {stats['added']}\n"
+        f"Already saved: {valid - stats['added']}\n"
+        f"Invalid: {stats['errors']}"
+    )
+    if errors:
+        report += "\n\n" + "\n".join(errors)
+        if stats["errors"] > len(errors):
+            report += f"\n...and {stats['errors'] - len(errors)} more"
+    await update.message.reply_text(
+        report[:4096],
+        reply_markup=main_keyboard_bottom(True)
+    )
+    return ConversationHandler.END
+
 # ================= LIST =================
+LIST_WORDS_SQL = "SELECT topic, level, word FROM words ORDER BY topic, level LIMIT 30"
+LIST_MY_WORDS_SQL = "SELECT word FROM personal_words WHERE user_id=? LIMIT 30"
+CLEAR_MY_WORDS_SQL = "DELETE FROM personal_words WHERE user_id=?"
+LIST_PUBLIC_WORDS_SQL = "SELECT * FROM words ORDER BY topic, level, id LIMIT 50"
+# Grouped by user id rather than username so it reads straight off
+# idx_personal_words_user instead of sorting every personal word
+LIST_PERSONAL_WORDS_SQL = """
+    SELECT pw.word, u.username FROM personal_words pw
+    JOIN users u ON pw.user_id = u.user_id
+    ORDER BY pw.user_id, pw.id LIMIT 50
+"""
+
 async def list_handler(update, context):
     text = update.message.text
     uid = update.effective_user.id
@@ -698,45 +1910,39 @@ async def list_handler(update, context):
         )
         return ConversationHandler.END
 
-    with db() as c:
-        if not is_admin:
-            # USER menu
-            if text == "Words":
-                rows = c.execute(
-                    "SELECT topic, level, word FROM words ORDER BY topic, level LIMIT 30"
-                ).fetchall()
-                msg = "\n".join(f"{r['topic']} | {r['level']} | {r['word']}" for r in rows)
-
-            elif text == "My Words":
-                rows = c.execute(
-                    "SELECT word FROM personal_words WHERE user_id=? LIMIT 30",
-                    (uid,)
-                ).fetchall()
-                # User words only, no @username
-                msg = "\n".join(r["word"] for r in rows)
-            elif text == "Clear My Words":
-                c.execute("DELETE FROM personal_words WHERE user_id=?", (uid,))
-                msg = "Your personal words have been cleared."
-            else:
-                msg = "No data."
-        else:
-            # ADMIN menu
-            if text == "Public Words":
-                rows = c.execute(
-                    "SELECT * FROM words ORDER BY topic, level, id LIMIT 50"
-                ).fetchall()
-                msg = "\n".join(
-                    f"{r['topic']} | {r['level']} | {r['word']}" for r in rows
-                )
-            elif text == "Personal Words":
-                rows = c.execute(
-                    "SELECT pw.word, u.username FROM personal_words pw "
-                    "JOIN users u ON pw.user_id=u.user_id "
-                    "ORDER BY u.username, pw.id LIMIT 50"
-                ).fetchall()
-                msg = "\n".join(f"@{r['username']}: {r['word']}" for r in rows)
+    def load():
+        with db() as c:
+            if not is_admin:
+                # USER menu
+                if text == "Words":
+                    rows = c.execute(LIST_WORDS_SQL).fetchall()
+                    msg = "\n".join(f"{r['topic']} | {r['level']} | {r['word']}" for r in rows)
+
+                elif text == "My Words":
+                    rows = c.execute(LIST_MY_WORDS_SQL, (uid,)).fetchall()
+                    # User words only, no @username
+                    msg = "\n".join(r["word"] for r in rows)
+                elif text == "Clear My Words":
+                    c.execute(CLEAR_MY_WORDS_SQL, (uid,))
+                    msg = "Your personal words have been cleared."
+                else:
+                    msg = "No data."
             else:
-                msg = "No data."
+                # ADMIN menu
+                if text == "Public Words":
+                    rows = c.execute(LIST_PUBLIC_WORDS_SQL).fetchall()
+                    msg = "\n".join(
+                        f"{r['topic']} | {r['level']} | {r['word']}" for r in rows
+                    )
+                elif text == "Personal Words":
+                    rows = c.execute(LIST_PERSONAL_WORDS_SQL).fetchall()
+                    msg = "\n".join(f"@{r['username']}: {r['word']}" for r in rows)
+                else:
+                    msg = "No data."
+        return msg
+
+    runner = db_write if text == "Clear My Words" else db_read
+    msg = await runner(load)
 
     await update.message.reply_text(
         msg or "No words found.",
@@ -744,18 +1950,125 @@ async def list_handler(update, context):
     )
     return ConversationHandler.END
 
+# ================= RATE LIMITING =================
+# Every bulk send waits for a slot: a token bucket for the global limit plus
+# a minimum gap per chat. send_with_retry turns the outcome into "sent",
+# "blocked", "rejected" (Telegram refused this message, e.g. broken Markdown;
+# sending it again won't help) or "failed" (transient, worth retrying later).
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = perf_counter()
+        self.blocked_until = 0
+        self.lock = asyncio.Lock()
+
+    # Flood control is bot-wide, so a RetryAfter holds back every sender
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, perf_counter() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = perf_counter()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+SEND_LIMITER = TokenBucket(SEND_RATE)
+_chat_next_send = {}
+
+async def wait_for_send_slot(chat_id):
+    loop = asyncio.get_running_loop()
+    if len(_chat_next_send) > 10000:
+        for cid in [k for k, v in _chat_next_send.items() if v < loop.time()]:
+            del _chat_next_send[cid]
+    ready = _chat_next_send.get(chat_id, 0)
+    _chat_next_send[chat_id] = max(ready, loop.time()) + SEND_CHAT_INTERVAL
+    if ready > loop.time():
+        await asyncio.sleep(ready - loop.time())
+    await SEND_LIMITER.acquire()
+
+async def send_with_retry(bot, chat_id, text, **kwargs):
+    for attempt in range(SEND_RETRIES):
+        await wait_for_send_slot(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            return "sent"
+        except RetryAfter as e:
+            SEND_LIMITER.pause(e.retry_after)
+        except Forbidden:
+            return "blocked"
+        except BadRequest as e:
+            print(f"❌ Send to {chat_id} rejected: {e}")
+            return "rejected"
+        except (TimedOut, NetworkError) as e:
+            print(f"❌ Send to {chat_id} failed ({attempt + 1}/{SEND_RETRIES}): {e}")
+            await asyncio.sleep(2 ** attempt)
+    return "failed"
+
+def mark_users_inactive(user_ids):
+    with db() as c:
+        c.executemany("UPDATE users SET active = 0 WHERE user_id = ?", [(u,) for u in user_ids])
+
 # ================= BROADCAST =================
+# Sends text to every chat in user_ids with BROADCAST_WORKERS workers sharing
+# the rate limiter. on_progress(counts, done) is awaited after each message.
+async def run_broadcast(bot, user_ids, text, on_progress=None):
+    counts = {"sent": 0, "failed": 0, "blocked": 0}
+    blocked = []
+    queue = asyncio.Queue()
+    for uid in user_ids:
+        queue.put_nowait(uid)
+
+    async def worker():
+        while not queue.empty():
+            uid = queue.get_nowait()
+            result = await send_with_retry(bot, uid, text)
+            counts["failed" if result == "rejected" else result] += 1
+            if result == "blocked":
+                blocked.append(uid)
+            if on_progress:
+                await on_progress(counts, sum(counts.values()))
+
+    await asyncio.gather(*(worker() for _ in range(min(BROADCAST_WORKERS, len(user_ids)))))
+    if blocked:
+        await db_write(mark_users_inactive, blocked)
+    return counts
+
 async def broadcast(update, context):
     msg = update.message.text
-    with db() as c:
-        users = c.execute("SELECT user_id FROM users").fetchall()
-    for u in users:
-        try:
-            await context.bot.send_message(u["user_id"], msg)
-        except:
-            pass
+    users = await db_read(query, "SELECT user_id FROM users WHERE active = 1")
+    total = len(users)
+    status = await update.message.reply_text(f"📣 Broadcasting to {total} users...")
+    last_edit = perf_counter()
+
+    async def on_progress(counts, done):
+        nonlocal last_edit
+        if done < total and perf_counter() - last_edit >= 3:
+            last_edit = perf_counter()
+            try:
+                await status.edit_text(
+                    f"📣 Broadcasting... {done}/{total}\n"
+                    f"✅ {counts['sent']}  ❌ {counts['failed']}  🚫 {counts['blocked']}"
+                )
+            except Exception as e:
+                print(f"❌ Broadcast progress update failed: {e}")
+
+    counts = await run_broadcast(context.bot, [u["user_id"] for u in users], msg, on_progress)
     await update.message.reply_text(
-        "Broadcast sent.",
+        f"Broadcast sent.\n"
+        f"✅ Sent: {counts['sent']}\n"
+        f"❌ Failed: {counts['failed']}\n"
+        f"🚫 Blocked: {counts['blocked']}",
         reply_markup=main_keyboard_bottom(True)
     )
     return ConversationHandler.END
@@ -763,11 +2076,10 @@ async def broadcast(update, context):
 # ================= START =================
 async def start(update, context):
     uid = update.effective_user.id
-    with db() as c:
-        c.execute(
-            "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
-            (uid,)
-        )
+    await db_write(query, """
+        INSERT INTO users (user_id) VALUES (?)
+        ON CONFLICT(user_id) DO UPDATE SET active = 1
+    """, (uid,))
     await update.message.reply_text(
         "Main Menu:",
         reply_markup=main_keyboard_bottom(uid in ADMIN_IDS)
@@ -775,30 +2087,246 @@ async def start(update, context):
     return ConversationHandler.END
 
 # ============== Auto Backup ==============
+# Backups snapshot the live database with SQLite's online backup API on a
+# worker thread. The copy is a single read transaction, so it is consistent
+# even while the writer is busy. The snapshot is gzipped, the nightly one is
+# uploaded once, and the other admins get the same Telegram file_id.
+#
+# With BACKUP_INCREMENTAL=1, the nights between full backups only ship the
+# pages that changed since the previous snapshot. The backup API copies page
+# N of the database to page N of the snapshot, so two snapshots can be
+# compared page by page. To restore, gunzip the last full backup and run
+# apply_backup_delta on it with each later delta, oldest first.
+BACKUP_DELTA_MAGIC = b"LINGODELTA1"
+
+def snapshot_db(dest_path):
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    src = sqlite3.connect(DB_PATH)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+def page_size_of(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        conn.close()
+
+def gzip_file(src_path, dest_path):
+    with open(src_path, "rb") as f, gzip.open(dest_path, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+
+# Delta layout (gzipped): magic, sha256 of the base snapshot, page size and
+# page count of the new snapshot, then (page number, page bytes) for every
+# page that differs from the base.
+def write_backup_delta(base_path, new_path, dest_path):
+    page_size = page_size_of(new_path)
+    if page_size_of(base_path) != page_size:
+        return None
+    page_count = os.path.getsize(new_path) // page_size
+    changed = 0
+    with open(base_path, "rb") as base, open(new_path, "rb") as new, \
+            gzip.open(dest_path, "wb", compresslevel=6) as out:
+        out.write(BACKUP_DELTA_MAGIC)
+        out.write(file_sha256(base_path))
+        out.write(struct.pack(">II", page_size, page_count))
+        for number in range(page_count):
+            page = new.read(page_size)
+            if base.read(page_size) != page:
+                out.write(struct.pack(">I", number))
+                out.write(page)
+                changed += 1
+    return changed, page_count
+
+def apply_backup_delta(db_path, delta_path):
+    with gzip.open(delta_path, "rb") as d:
+        if d.read(len(BACKUP_DELTA_MAGIC)) != BACKUP_DELTA_MAGIC:
+            raise ValueError("Not a backup delta")
+        if d.read(32) != file_sha256(db_path):
+            raise ValueError("Delta was taken against a different snapshot")
+        page_size, page_count = struct.unpack(">II", d.read(8))
+        with open(db_path, "r+b") as f:
+            while header := d.read(4):
+                (number,) = struct.unpack(">I", header)
+                f.seek(number * page_size)
+                f.write(d.read(page_size))
+            f.truncate(page_count * page_size)
+
+def read_backup_chain():
+    try:
+        with open(os.path.join(BACKUP_DIR, "chain.json")) as f:
+            return json.load(f)["deltas"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Builds the file to upload. The local chain (last_snapshot.db + chain.json)
+# only moves forward in commit_backup, once an upload went through, so a
+# failed night never leaves a gap between deltas.
+def make_backup(kind, ts_file, incremental=False):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    snapshot = os.path.join(BACKUP_DIR, f"{kind}_snapshot.db")
+    last = os.path.join(BACKUP_DIR, "last_snapshot.db")
+    snapshot_db(snapshot)
+
+    backup = {"kind": kind, "snapshot": snapshot, "delta": None, "incremental": incremental}
+    deltas = read_backup_chain()
+    if incremental and deltas is not None and deltas < BACKUP_FULL_EVERY and os.path.exists(last):
+        path = os.path.join(BACKUP_DIR, f"backup_{kind}_{ts_file}.delta.gz")
+        delta = write_backup_delta(last, snapshot, path)
+        if delta:
+            backup.update(path=path, filename=os.path.basename(path), delta=delta, deltas=deltas + 1)
+            return backup
+
+    path = os.path.join(BACKUP_DIR, f"backup_{kind}_{ts_file}.db.gz")
+    gzip_file(snapshot, path)
+    backup.update(path=path, filename=os.path.basename(path), deltas=0)
+    return backup
+
+# Only incremental mode needs the base snapshot; otherwise any base left
+# from an earlier incremental run is dropped too.
+def commit_backup(backup):
+    last = os.path.join(BACKUP_DIR, "last_snapshot.db")
+    chain = os.path.join(BACKUP_DIR, "chain.json")
+    if backup["kind"] == "auto" and backup["incremental"]:
+        os.replace(backup["snapshot"], last)
+        with open(chain, "w") as f:
+            json.dump({"deltas": backup["deltas"]}, f)
+    elif backup["kind"] == "auto":
+        for path in (last, chain):
+            if os.path.exists(path):
+                os.remove(path)
+    discard_backup(backup)
+
+def discard_backup(backup):
+    for path in (backup["snapshot"], backup["path"]):
+        if os.path.exists(path):
+            os.remove(path)
+
+def backup_size_text(backup):
+    size = os.path.getsize(backup["path"]) / (1024 * 1024)
+    if backup["delta"]:
+        changed, pages = backup["delta"]
+        return f"🧩 Incremental: {changed}/{pages} pages, {size:.1f} MB"
+    return f"🗜 Full: {size:.1f} MB"
+
 async def auto_backup(context):
     now = datetime.now()
     # 1. Format for Filename (Uses _ which is safe for files)
     ts_file = now.strftime("%Y-%m-%d_%H-%M")
     # 2. Format for Chat Caption (Uses space to avoid crashing Markdown)
     ts_text = now.strftime("%Y-%m-%d %H:%M")
-    
-    filename = f"backup_auto_{ts_file}.db"
 
-    # Send backup to ALL Admins
+    try:
+        backup = await asyncio.to_thread(make_backup, "auto", ts_file, BACKUP_INCREMENTAL)
+    except Exception as e:
+        print(f"❌ Auto-backup snapshot failed: {e}")
+        return
+
+    # We use single * for bold in standard Markdown, and ts_text (no underscores)
+    caption = f"🌙 *Nightly Backup*\n📅 {ts_text}\n{backup_size_text(backup)}\n🛡 System Auto-Save"
+
+    # Upload once, then send the same file_id to the other admins
+    file_id = None
     for admin_id in ADMIN_IDS:
         try:
-            with open(DB_PATH, 'rb') as f:
+            if file_id is None:
+                with open(backup["path"], "rb") as f:
+                    msg = await context.bot.send_document(
+                        chat_id=admin_id,
+                        document=f,
+                        filename=backup["filename"],
+                        caption=caption,
+                        parse_mode="Markdown"
+                    )
+                file_id = msg.document.file_id
+            else:
                 await context.bot.send_document(
                     chat_id=admin_id,
-                    document=f,
-                    filename=filename,
-                    # We use single * for bold in standard Markdown, and ts_text (no underscores)
-                    caption=f"🌙 *Nightly Backup*\n📅 {ts_text}\n🛡 System Auto-Save",
+                    document=file_id,
+                    caption=caption,
                     parse_mode="Markdown"
                 )
         except Exception as e:
             print(f"❌ Auto-backup failed for {admin_id}: {e}")
 
+    if file_id:
+        await asyncio.to_thread(commit_backup, backup)
+    else:
+        await asyncio.to_thread(discard_backup, backup)
+
+# ================= CACHE STATS COMMAND =================
+async def cache_command(update, context):
+    uid = update.effective_user.id
+    if uid not in ADMIN_IDS:
+        return
+
+    def counts():
+        with db() as c:
+            return (
+                c.execute("SELECT COUNT(*) FROM scrape_cache").fetchone()[0],
+                c.execute("SELECT COUNT(*) FROM scrape_cache WHERE data IS NULL").fetchone()[0],
+                c.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0],
+                c.execute("SELECT COUNT(*) FROM offline_dict").fetchone()[0],
+            )
+
+    rows, negative, ai_rows, offline_rows = await db_read(counts)
+    lookups = CACHE_STATS["hits"] + CACHE_STATS["misses"]
+    rate = CACHE_STATS["hits"] * 100 / lookups if lookups else 0
+    await update.message.reply_text(
+        f"📇 Dictionary cache\n"
+        f"Entries: {rows} ({negative} not found)\n"
+        f"Hits: {CACHE_STATS['hits']}\n"
+        f"Misses: {CACHE_STATS['misses']}\n"
+        f"Hit rate: {rate:.1f}%\n\n"
+        f"🤖 AI cache\n"
+        f"Entries: {ai_rows}\n"
+        f"Hits: {CACHE_STATS['ai_hits']}\n"
+        f"Misses: {CACHE_STATS['ai_misses']}\n\n"
+        f"📚 Offline dictionary\n"
+        f"Entries: {offline_rows}\n"
+        f"Hits: {CACHE_STATS['offline_hits']}"
+    )
+
+# ================= STATS COMMAND =================
+def latency_summary(samples):
+    if not samples:
+        return "no data"
+    ordered = sorted(samples)
+    avg = sum(ordered) / len(ordered)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"avg {avg:.2f}s, p95 {p95:.2f}s, max {ordered[-1]:.2f}s ({len(ordered)} samples)"
+
+async def stats_command(update, context):
+    uid = update.effective_user.id
+    if uid not in ADMIN_IDS:
+        return
+
+    outbox = {
+        r["status"]: r["n"] for r in await db_read(
+            query, "SELECT status, COUNT(*) AS n FROM daily_outbox GROUP BY status"
+        )
+    }
+    await update.message.reply_text(
+        f"📊 Stats\n"
+        f"AI latency: {latency_summary(AI_LATENCIES)}\n"
+        f"Daily tick lag: {latency_summary(DAILY_TICKS)}\n"
+        f"Outbox: {outbox.get('pending', 0)} pending, {outbox.get('failed', 0)} failed\n\n"
+        f"🔎 Sources\n{source_summary()}"
+    )
+
 # ================= MANUAL BACKUP COMMAND =================
 async def backup_command(update, context):
     uid = update.effective_user.id
@@ -808,81 +2336,554 @@ async def backup_command(update, context):
     now = datetime.now()
     ts_file = now.strftime("%Y-%m-%d_%H-%M")
     ts_text = now.strftime("%Y-%m-%d %H:%M")
-    
-    filename = f"backup_manual_{ts_file}.db"
 
+    # Manual backups are always full, so they restore on their own
+    backup = None
     try:
-        with open(DB_PATH, 'rb') as f:
+        backup = await asyncio.to_thread(make_backup, "manual", ts_file)
+        with open(backup["path"], "rb") as f:
             await update.message.reply_document(
                 document=f,
-                filename=filename,
-                caption=f"📦 *Manual Backup*\n📅 {ts_text}\n🛡 Safe and sound!",
+                filename=backup["filename"],
+                caption=f"📦 *Manual Backup*\n📅 {ts_text}\n{backup_size_text(backup)}\n🛡 Safe and sound!",
                 parse_mode="Markdown"
             )
     except Exception as e:
         await update.message.reply_text(f"❌ Backup failed: {e}")
+    finally:
+        if backup:
+            await asyncio.to_thread(discard_backup, backup)
 
 # ============== Daily Words ==============
-async def send_daily_words(context):
-    tehran = pytz.timezone("Asia/Tehran")
-    now = datetime.now(tehran).strftime("%H:%M")
+# Every user's local daily_time is stored as a UTC minute of day
+# (daily_utc_minute), and users are grouped into buckets by that minute. Each
+# bucket has its own run_daily job, so minutes nobody picked cost nothing.
+# The UTC minutes are recomputed hourly so DST changes move users to the right
+# bucket.
+TEHRAN = pytz.timezone("Asia/Tehran")
+DAILY_BUCKETS = {}   # UTC minute of day -> set of user ids
+USER_BUCKET = {}     # user id -> UTC minute of day
+TZ_OFFSETS = {}      # timezone name -> UTC offset (minutes) last applied
+CATCHUP_LIMIT = 24 * 60
+
+def minute_of_day(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+def utc_offset_minutes(tz_name):
+    return int(datetime.now(pytz.timezone(tz_name)).utcoffset().total_seconds() // 60)
+
+def to_utc_minute(daily_time, tz_name):
+    return (minute_of_day(daily_time) - utc_offset_minutes(tz_name)) % 1440
+
+def bucket_job_name(minute):
+    return f"daily_{minute}"
+
+def schedule_bucket(job_queue, minute):
+    if not job_queue.get_jobs_by_name(bucket_job_name(minute)):
+        job_queue.run_daily(
+            send_daily_words,
+            time=time(hour=minute // 60, minute=minute % 60, tzinfo=pytz.utc),
+            data=minute,
+            name=bucket_job_name(minute)
+        )
+
+def update_daily_bucket(job_queue, uid, utc_minute):
+    old = USER_BUCKET.pop(uid, None)
+    if old is not None:
+        DAILY_BUCKETS[old].discard(uid)
+        if not DAILY_BUCKETS[old]:
+            del DAILY_BUCKETS[old]
+            for job in job_queue.get_jobs_by_name(bucket_job_name(old)):
+                job.schedule_removal()
+
+    if utc_minute is not None:
+        USER_BUCKET[uid] = utc_minute
+        DAILY_BUCKETS.setdefault(utc_minute, set()).add(uid)
+        schedule_bucket(job_queue, utc_minute)
+
+DAILY_BUCKET_ROWS_SQL = """
+    SELECT user_id, daily_utc_minute FROM users
+    WHERE daily_enabled = 1 AND daily_utc_minute IS NOT NULL
+"""
 
+def daily_bucket_rows():
+    return query(DAILY_BUCKET_ROWS_SQL)
+
+def load_daily_buckets(job_queue, rows=None):
+    if rows is None:
+        rows = daily_bucket_rows()
+    for uid in set(USER_BUCKET) - {r["user_id"] for r in rows}:
+        update_daily_bucket(job_queue, uid, None)
+    for r in rows:
+        if USER_BUCKET.get(r["user_id"]) != r["daily_utc_minute"]:
+            update_daily_bucket(job_queue, r["user_id"], r["daily_utc_minute"])
+
+# Only timezones whose offset changed since the last pass are rewritten
+LOCAL_TO_UTC_MINUTE = """
+    ((CAST(substr(daily_time, 1, 2) AS INTEGER) * 60
+      + CAST(substr(daily_time, 4, 2) AS INTEGER) - ?) % 1440 + 1440) % 1440
+"""
+
+# Users whose UTC minute moves also get their precomputed words moved, or
+# the tick at the new minute would queue a second set next to them.
+def recompute_utc_minutes():
+    changed = False
+    now_minute = current_epoch_minute()
     with db() as c:
-        users = c.execute("""
-            SELECT * FROM users
-            WHERE daily_enabled = 1
-              AND daily_time = ?
-        """, (now,)).fetchall()
-
-    for u in users:
-        for _ in range(u["daily_count"]):
-            word = pick_word_for_user(u["user_id"])
-            if not word:
+        zones = [r["timezone"] for r in c.execute(
+            "SELECT DISTINCT timezone FROM users WHERE daily_time IS NOT NULL"
+        )]
+        for tz_name in zones:
+            try:
+                offset = utc_offset_minutes(tz_name or "Asia/Tehran")
+            except pytz.UnknownTimeZoneError:
+                continue
+            if TZ_OFFSETS.get(tz_name) == offset:
                 continue
+            moved = [r["user_id"] for r in c.execute(f"""
+                SELECT user_id FROM users
+                WHERE timezone IS ? AND daily_time IS NOT NULL
+                  AND daily_utc_minute IS NOT {LOCAL_TO_UTC_MINUTE}
+            """, (tz_name, offset))]
+            c.execute(f"""
+                UPDATE users SET daily_utc_minute = {LOCAL_TO_UTC_MINUTE}
+                WHERE timezone IS ? AND daily_time IS NOT NULL
+            """, (offset, tz_name))
+            for uid in moved:
+                if c.execute("SELECT 1 FROM daily_queue_cursor WHERE user_id=?", (uid,)).fetchone():
+                    u = c.execute("SELECT * FROM users WHERE user_id=?", (uid,)).fetchone()
+                    precompute_user(c, u, now_minute)
+            TZ_OFFSETS[tz_name] = offset
+            changed = True
+    return changed
+
+async def refresh_utc_minutes(context):
+    if await db_write(recompute_utc_minutes):
+        load_daily_buckets(context.job_queue, await db_read(daily_bucket_rows))
+
+STATE_SQL = "SELECT value FROM bot_state WHERE key=?"
+
+def get_state(key, default=None):
+    with db() as c:
+        row = c.execute(STATE_SQL, (key,)).fetchone()
+    return row["value"] if row else default
+
+def set_state(key, value):
+    with db() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO bot_state (key, value) VALUES (?,?)",
+            (key, str(value))
+        )
+
+def current_epoch_minute():
+    return int(datetime.now(pytz.utc).timestamp() // 60)
+
+def record_daily_run(c, epoch_minute):
+    c.execute("""
+        INSERT INTO bot_state (key, value) VALUES ('daily_last_minute', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        WHERE CAST(value AS INTEGER) < CAST(excluded.value AS INTEGER)
+    """, (str(epoch_minute),))
+
+def mark_daily_run(epoch_minute):
+    with db() as c:
+        record_daily_run(c, epoch_minute)
+
+# ============== Daily Outbox ==============
+# A tick only picks each user's words and writes them to daily_outbox. The
+# cursor advance, the outbox rows and daily_last_minute are committed in one
+# transaction. A single long-running worker drains the outbox through the
+# send rate limiter:
+# - a sent row is deleted
+# - a failed send is retried with backoff, then hourly after
+#   OUTBOX_MAX_ATTEMPTS, until it is OUTBOX_MAX_AGE past its minute
+# - a word Telegram rejects is resent once as plain text
+# - rows for a user who blocked the bot are dropped
+# Rows that still fail are kept as 'failed' for /stats and purged by the
+# nightly precompute after OUTBOX_FAILED_KEEP.
+# Pending rows survive restarts. DAILY_TICKS keeps the lag from each tick's
+# scheduled minute to its last delivered message.
+DAILY_TICKS = deque(maxlen=200)
+OUTBOX_WAKE = asyncio.Event()
+_tick_lag = {}  # scheduled_at -> seconds until its latest delivery
+_outbox_task = None
+
+def daily_word_text(word):
+    return (
+        f"*{word['word']}*\n"
+        f"{word['definition']}\n"
+        f"_Level: {word['level']}_"
+    )
+
+def daily_word_plain(word):
+    return f"{word['word']}\n{word['definition']}\nLevel: {word['level']}"
+
+BUCKET_USERS_SQL = """
+    SELECT user_id, daily_count, daily_level, daily_pos FROM users
+    WHERE daily_enabled = 1
+      AND daily_utc_minute = ?
+      AND active = 1
+      AND NOT EXISTS (
+          SELECT 1 FROM daily_outbox o
+          WHERE o.user_id = users.user_id AND o.scheduled_at = ?
+      )
+"""
+
+def enqueue_daily_bucket(epoch_minute):
+    scheduled_at = epoch_minute * 60
+    with db() as c:
+        users = c.execute(BUCKET_USERS_SQL, (epoch_minute % 1440, scheduled_at)).fetchall()
+        rows = []
+        for u in users:
+            for word in pick_words(c, u["user_id"], u["daily_count"], u["daily_level"], u["daily_pos"]):
+                rows.append((u["user_id"], word["id"], scheduled_at, scheduled_at))
+        c.executemany(
+            "INSERT INTO daily_outbox (user_id, word_id, scheduled_at, next_attempt) VALUES (?,?,?,?)",
+            rows
+        )
+        record_daily_run(c, epoch_minute)
+    return len(rows)
+
+DUE_OUTBOX_SQL = """
+    SELECT o.id, o.user_id, o.scheduled_at, o.attempts,
+           w.word, w.definition, w.level, u.daily_mode
+    FROM daily_outbox o
+    JOIN words w ON w.id = o.word_id
+    JOIN users u ON u.user_id = o.user_id
+    WHERE o.status = 'pending' AND o.next_attempt <= ?
+    ORDER BY o.next_attempt, o.id
+    LIMIT ?
+"""
 
-            # Safer formatting for daily words
-            word_text = word['word']
-            if '(' in word_text and ')' in word_text:
-                display_word = word_text.split('(')[0].strip()
+def due_outbox_rows(limit):
+    with db() as c:
+        return c.execute(DUE_OUTBOX_SQL, (int(now_ts()), limit)).fetchall()
+
+# A failed row's next_attempt is the time it failed, for the purge
+def finish_outbox_rows(sent, retry, blocked_users, rejected=()):
+    now = int(now_ts())
+    with db() as c:
+        c.executemany("DELETE FROM daily_outbox WHERE id = ?", [(i,) for i in sent])
+        c.executemany(
+            "UPDATE daily_outbox SET status = 'failed', next_attempt = ? WHERE id = ?",
+            [(now, i) for i in rejected]
+        )
+        for row_id, attempts, scheduled_at in retry:
+            if now - scheduled_at >= OUTBOX_MAX_AGE:
+                c.execute(
+                    "UPDATE daily_outbox SET status = 'failed', attempts = ?, next_attempt = ? WHERE id = ?",
+                    (attempts + 1, now, row_id)
+                )
             else:
-                display_word = word_text
+                delay = 60 * 2 ** attempts if attempts < OUTBOX_MAX_ATTEMPTS else OUTBOX_SLOW_RETRY
+                c.execute(
+                    "UPDATE daily_outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                    (attempts + 1, now + delay, row_id)
+                )
+        c.executemany(
+            "DELETE FROM daily_outbox WHERE user_id = ? AND status = 'pending'",
+            [(u,) for u in blocked_users]
+        )
+        c.executemany("UPDATE users SET active = 0 WHERE user_id = ?", [(u,) for u in blocked_users])
+
+# In digest mode a user's words are packed into as few messages as fit
+# under DIGEST_MAX_CHARS. Otherwise each word is its own message.
+def delivery_chunks(user_rows):
+    if user_rows[0]["daily_mode"] != "digest":
+        return [(daily_word_text(r), [r]) for r in user_rows]
+
+    chunks, text, rows = [], "📚 *Your daily words*", []
+    for r in user_rows:
+        entry = daily_word_text(r)
+        if rows and len(text) + len(entry) + 2 > DIGEST_MAX_CHARS:
+            chunks.append((text, rows))
+            text, rows = entry, [r]
+        else:
+            text += "\n\n" + entry
+            rows.append(r)
+    chunks.append((text, rows))
+    return chunks
+
+async def drain_outbox_batch(bot, rows):
+    by_user = {}
+    for r in rows:
+        by_user.setdefault(r["user_id"], []).append(r)
+    queue = asyncio.Queue()
+    for user_rows in by_user.values():
+        queue.put_nowait(user_rows)
+    sent, retry, blocked, rejected = [], [], [], []
+
+    async def worker():
+        while not queue.empty():
+            user_rows = queue.get_nowait()
+            chunks = deque((text, rows, "Markdown") for text, rows in delivery_chunks(user_rows))
+            while chunks:
+                text, chunk_rows, parse_mode = chunks.popleft()
+                result = await send_with_retry(
+                    bot, user_rows[0]["user_id"], text, parse_mode=parse_mode
+                )
+                if result == "sent":
+                    for r in chunk_rows:
+                        sent.append(r["id"])
+                        lag = now_ts() - r["scheduled_at"]
+                        _tick_lag[r["scheduled_at"]] = max(_tick_lag.get(r["scheduled_at"], 0), lag)
+                elif result == "blocked":
+                    blocked.append(user_rows[0]["user_id"])
+                    break
+                elif result == "rejected":
+                    # A refused digest is resent word by word, and a refused
+                    # word once more without Markdown, so only a word
+                    # Telegram can't take at all is dropped
+                    if len(chunk_rows) > 1:
+                        chunks.extendleft(reversed([
+                            (daily_word_text(r), [r], "Markdown") for r in chunk_rows
+                        ]))
+                    elif parse_mode:
+                        chunks.appendleft((daily_word_plain(chunk_rows[0]), chunk_rows, None))
+                    else:
+                        rejected.append(chunk_rows[0]["id"])
+                else:
+                    retry.extend(
+                        (r["id"], r["attempts"], r["scheduled_at"])
+                        for rest in [chunk_rows, *(rows for _, rows, _ in chunks)] for r in rest
+                    )
+                    break
 
-            text = (
-                f"*{display_word}*\n"
-                f"{word['definition']}\n"
-                f"_Level: {word['level']}_"
-            )
+    await asyncio.gather(*(worker() for _ in range(min(DAILY_WORKERS, len(by_user)))))
+    await db_write(finish_outbox_rows, sent, retry, blocked, rejected)
+    return len(sent)
 
+async def outbox_worker(bot):
+    while True:
+        try:
+            rows = await db_write(due_outbox_rows, OUTBOX_BATCH)
+            if rows:
+                await drain_outbox_batch(bot, rows)
+                continue
+
+            for scheduled_at, lag in sorted(_tick_lag.items()):
+                DAILY_TICKS.append(lag)
+                print(f"📬 Daily tick {scheduled_at // 60 % 1440} delivered {lag:.1f}s after schedule")
+            _tick_lag.clear()
+
+            OUTBOX_WAKE.clear()
             try:
-                await context.bot.send_message(
-                    chat_id=u["user_id"],
-                    text=text,
-                    parse_mode="Markdown"
-                )
-            except:
+                await asyncio.wait_for(OUTBOX_WAKE.wait(), timeout=30)
+            except asyncio.TimeoutError:
                 pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Outbox worker error: {e}")
+            await asyncio.sleep(5)
+
+async def start_outbox_worker(app):
+    global _outbox_task
+    _outbox_task = asyncio.create_task(outbox_worker(app.bot))
+
+async def stop_background_tasks(app):
+    if _outbox_task:
+        _outbox_task.cancel()
+    await close_http_client()
+
+# ============== Daily Precompute ==============
+# Off-peak, each enabled user's next daily words are picked ahead of time and
+# written to daily_outbox with next_attempt at their fire time. At the
+# delivery minute the tick finds them already queued and only wakes the
+# worker. daily_queue_cursor keeps the user's cursor from before the picks.
+# When settings change, the queued rows are dropped, the cursor is restored
+# and only that user's words are picked again.
+def next_fire_minute(utc_minute, now_minute):
+    return now_minute + (utc_minute - now_minute - 1) % 1440 + 1
+
+FUTURE_QUEUE_WHERE = "user_id = ? AND scheduled_at > ? AND status = 'pending' AND attempts = 0"
+FUTURE_QUEUE_COUNT_SQL = f"SELECT COUNT(*) FROM daily_outbox WHERE {FUTURE_QUEUE_WHERE}"
+FUTURE_QUEUE_DELETE_SQL = f"DELETE FROM daily_outbox WHERE {FUTURE_QUEUE_WHERE}"
+
+def precompute_user(c, u, now_minute):
+    uid = u["user_id"]
+    future = (uid, now_minute * 60)
+    queued = c.execute(FUTURE_QUEUE_COUNT_SQL, future).fetchone()[0]
+    snap = c.execute(
+        "SELECT filter_key, seed, pos, wrapped FROM daily_queue_cursor WHERE user_id=?", (uid,)
+    ).fetchone()
+    if queued and snap:
+        if snap["seed"] is None:
+            c.execute(
+                "DELETE FROM word_cursor WHERE user_id=? AND filter_key=?",
+                (uid, snap["filter_key"])
+            )
+        else:
+            c.execute(
+                "INSERT OR REPLACE INTO word_cursor (user_id, filter_key, seed, pos, wrapped) VALUES (?,?,?,?,?)",
+                (uid, snap["filter_key"], snap["seed"], snap["pos"], snap["wrapped"])
+            )
+    c.execute(FUTURE_QUEUE_DELETE_SQL, future)
+    c.execute("DELETE FROM daily_queue_cursor WHERE user_id=?", (uid,))
+
+    if not (u["daily_enabled"] and u["active"] and u["daily_utc_minute"] is not None):
+        return 0
+
+    filter_key = walk_filter_key(u["daily_level"], u["daily_pos"])
+    c.execute("""
+        INSERT INTO daily_queue_cursor (user_id, filter_key, seed, pos, wrapped)
+        SELECT ?, ?, w.seed, w.pos, w.wrapped
+        FROM (SELECT 1) LEFT JOIN word_cursor w ON w.user_id = ? AND w.filter_key = ?
+    """, (uid, filter_key, uid, filter_key))
+    scheduled_at = next_fire_minute(u["daily_utc_minute"], now_minute) * 60
+    rows = [
+        (uid, word["id"], scheduled_at, scheduled_at)
+        for word in pick_words(c, uid, u["daily_count"], u["daily_level"], u["daily_pos"])
+    ]
+    c.executemany(
+        "INSERT INTO daily_outbox (user_id, word_id, scheduled_at, next_attempt) VALUES (?,?,?,?)",
+        rows
+    )
+    return len(rows)
+
+def precompute_chunk(after_id):
+    now_minute = current_epoch_minute()
+    with db() as c:
+        users = c.execute("""
+            SELECT * FROM users
+            WHERE daily_enabled = 1 AND active = 1 AND user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        """, (after_id, PRECOMPUTE_CHUNK)).fetchall()
+        queued = sum(precompute_user(c, u, now_minute) for u in users)
+    return (users[-1]["user_id"] if users else None), queued
+
+def requeue_user(uid):
+    with db() as c:
+        has_queue = c.execute(
+            "SELECT 1 FROM daily_queue_cursor WHERE user_id=?", (uid,)
+        ).fetchone()
+        if has_queue:
+            u = c.execute("SELECT * FROM users WHERE user_id=?", (uid,)).fetchone()
+            precompute_user(c, u, current_epoch_minute())
+
+FAILED_OUTBOX_PURGE_SQL = "DELETE FROM daily_outbox WHERE status = 'failed' AND next_attempt < ?"
+
+def purge_failed_outbox():
+    with db() as c:
+        return c.execute(FAILED_OUTBOX_PURGE_SQL, (int(now_ts()) - OUTBOX_FAILED_KEEP,)).rowcount
+
+async def precompute_daily_words(context):
+    purged = await db_write(purge_failed_outbox)
+    if purged:
+        print(f"🧹 Purged {purged} failed daily words")
+    after_id, total = -1, 0
+    while after_id is not None:
+        after_id, queued = await db_write(precompute_chunk, after_id)
+        total += queued
+    print(f"🗓 Precomputed {total} daily words")
+
+async def send_daily_words(context):
+    now = current_epoch_minute()
+    epoch_minute = now - (now - context.job.data) % 1440
+    await db_write(enqueue_daily_bucket, epoch_minute)
+    OUTBOX_WAKE.set()
+
+# Buckets whose minute passed while the bot was down are queued on startup
+async def catch_up_daily_words(context):
+    now = current_epoch_minute()
+    last = await db_read(get_state, "daily_last_minute")
+    if last is not None:
+        start = max(int(last) + 1, now - CATCHUP_LIMIT + 1)
+        for m in range(start, now + 1):
+            if m % 1440 in DAILY_BUCKETS:
+                await db_write(enqueue_daily_bucket, m)
+    await db_write(mark_daily_run, now)
+    OUTBOX_WAKE.set()
+
+# ================= QUERY PLANS =================
+# The queries on the hot paths, with sample parameters, built from the same
+# SQL the functions run. check_query_plans runs at startup and warns; run
+#   python lingo.py check-plans
+# to fail (exit 1) if any of them falls back to a full table scan or a
+# temporary sort.
+HOT_QUERIES = [
+    (CURSOR_SQL, (1, "")),
+    walk_query(0, None, 0),
+    walk_query(0, 5, 0),
+    walk_query(0, 5, 1),
+    walk_query(0, None, 0, 1, "B1", "noun"),
+    walk_query(0, None, 0, 1, "B1"),
+    walk_query(0, None, 0, 1, None, "noun"),
+    walk_query(0, 5, 1, 1, "B1", "noun"),
+    (BUCKET_USERS_SQL, (0, 0)),
+    (FUTURE_QUEUE_COUNT_SQL, (1, 0)),
+    (FUTURE_QUEUE_DELETE_SQL, (1, 0)),
+    (DUE_OUTBOX_SQL, (0, 1)),
+    (FAILED_OUTBOX_PURGE_SQL, (0,)),
+    (DAILY_BUCKET_ROWS_SQL, ()),
+    (LIST_WORDS_SQL, ()),
+    (LIST_PUBLIC_WORDS_SQL, ()),
+    (LIST_PERSONAL_WORDS_SQL, ()),
+    (LIST_MY_WORDS_SQL, (1,)),
+    (CLEAR_MY_WORDS_SQL, (1,)),
+    (SCRAPE_CACHE_SQL, ("a", "b")),
+    (AI_CACHE_SQL, ("a",)),
+    (PUBLIC_WORD_EXISTS_SQL, ("a",)),
+    (PERSONAL_WORD_EXISTS_SQL, (1, "a")),
+    (OFFLINE_LOOKUP_SQL, ("a",)),
+    (STATE_SQL, ("a",)),
+]
+
+def check_query_plans(c):
+    problems = []
+    for sql, params in HOT_QUERIES:
+        for row in c.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row["detail"]
+            if (detail.startswith("SCAN ") and " USING " not in detail) or "TEMP B-TREE" in detail:
+                problems.append(f"{' '.join(sql.split())}\n    -> {detail}")
+    for p in problems:
+        print(f"⚠️ Slow query plan: {p}")
+    return problems
+
+def check_plans_command():
+    init_db()
+    problems = check_query_plans(db())
+    print(f"{len(problems)} slow query plan(s) in {len(HOT_QUERIES)} hot queries")
+    sys.exit(1 if problems else 0)
 
 # ================= MAIN =================
 def main():
     init_db()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    check_query_plans(db())
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .post_init(start_outbox_worker)
+        .post_shutdown(stop_background_tasks)
+        .build()
+    )
 
-    app.job_queue.run_repeating(send_daily_words, interval=60, first=10)
+    recompute_utc_minutes()
+    load_daily_buckets(app.job_queue)
+    app.job_queue.run_repeating(refresh_utc_minutes, interval=3600, first=3600)
+    app.job_queue.run_once(catch_up_daily_words, when=0)
 
-    # Define your timezone (Tehran is what you used before)
-    tehran_tz = pytz.timezone("Asia/Tehran")
-    
     # Set time to 00:00 (Midnight)
-    midnight_time = time(hour=0, minute=0, second=0, tzinfo=tehran_tz)
+    midnight_time = time(hour=0, minute=0, second=0, tzinfo=TEHRAN)
 
     # Schedule the job
     app.job_queue.run_daily(auto_backup, time=midnight_time)
+
+    # Pick tomorrow's daily words off-peak
+    app.job_queue.run_daily(
+        precompute_daily_words,
+        time=time(hour=3, minute=30, second=0, tzinfo=TEHRAN)
+    )
     
     conv = ConversationHandler(
         entry_points=[
             CommandHandler("start", start),
             CommandHandler("version", version_command),
-            CommandHandler("backup", backup_command),
+            CommandHandler("backup", backup_command, block=False),
+            CommandHandler("cache", cache_command),
+            CommandHandler("stats", stats_command),
             MessageHandler(filters.TEXT & ~filters.COMMAND, main_menu_handler)
         ],
         states={
@@ -896,15 +2897,18 @@ def main():
     
             # ADD WORD CHOICE (manual / AI)
             6: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_word_choice_handler)],
-            7: [MessageHandler(filters.TEXT & ~filters.COMMAND, ai_add)],
+            7: [MessageHandler(filters.TEXT & ~filters.COMMAND, ai_add, block=False)],
     
             # BROADCAST (admin)
-            9: [MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast)],
+            9: [MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast, block=False)],
     
             # BULK ADD
             10: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_add_choice)],
-            11: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_add_manual)],
-            12: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_add_ai)],
+            11: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_add_manual),
+                MessageHandler(filters.Document.ALL, bulk_add_document, block=False),
+            ],
+            12: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_add_ai, block=False)],
     
             # LIST WORDS
             20: [MessageHandler(filters.TEXT & ~filters.COMMAND, list_handler)],
@@ -912,8 +2916,14 @@ def main():
             # DAILY WORDS CONFIG
             DAILY_COUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_count_handler)],
             DAILY_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_time_handler)],
+            DAILY_TZ: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_tz_handler)],
             DAILY_LEVEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_level_handler)],
             DAILY_POS: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_pos_handler)],
+            DAILY_MODE: [MessageHandler(filters.TEXT & ~filters.COMMAND, daily_mode_handler)],
+
+            # While a non-blocking handler (AI add, bulk add) is still running,
+            # only /cancel gets through; it stops the task in AI_TASKS
+            ConversationHandler.WAITING: [CommandHandler("cancel", cancel)],
         },
         fallbacks=[CommandHandler("cancel", cancel)]
     )
@@ -922,5 +2932,10 @@ def main():
     app.run_polling()
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 2 and sys.argv[1] == "import-dict":
+        import_dictionary(*sys.argv[2:4])
+    elif len(sys.argv) > 1 and sys.argv[1] == "check-plans":
+        check_plans_command()
+    else:
+        main()
 
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import threading
+from time import sleep
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lingo
+
+
+@pytest.fixture
+def bot_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(lingo, "DB_PATH", str(tmp_path / "test.db"))
+    lingo.init_db()
+    return lingo.DB_PATH
+
+
+# A local HTTP server in a background thread. respond(handler) returns
+# (status, content_type, body) and may sleep to play a slow site.
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(respond):
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self):
+                status, content_type, body = respond(self)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.reply()
+
+            def do_POST(self):
+                self.body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                self.reply()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def slow(seconds, status, content_type, body):
+    def respond(handler):
+        sleep(seconds)
+        return status, content_type, body
+    return respond
+
+
+class FakeMessage:
+    def __init__(self, text):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(uid, text=""):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=uid), message=FakeMessage(text))
+
+
+def fake_context():
+    return SimpleNamespace(user_data={})
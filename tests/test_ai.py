@@ -0,0 +1,96 @@
+import json
+import asyncio
+from time import perf_counter
+
+import lingo
+from groq import AsyncGroq
+from conftest import slow, fake_update, fake_context
+
+AI_DELAY = 1.5
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": lingo.AI_MODEL,
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "definition: to move fast on foot\nlevel: A1"},
+        "finish_reason": "stop",
+    }],
+}).encode()
+
+
+def fake_groq(stub_server, monkeypatch):
+    base = stub_server(slow(AI_DELAY, 200, "application/json", COMPLETION))
+    monkeypatch.setattr(lingo, "client", AsyncGroq(api_key="test", base_url=base, max_retries=0))
+    monkeypatch.setattr(lingo, "SCRAPERS", [])
+    monkeypatch.setattr(lingo, "_ai_inflight", {})
+
+
+def add_words(n):
+    lingo.query(
+        "INSERT INTO words (topic, word, definition, level, shuffle_key) VALUES "
+        + ",".join(f"('t', 'w{i}', 'd', 'A1', {lingo.new_seed()})" for i in range(n))
+    )
+
+
+async def get_word_latencies(users):
+    latencies = []
+    for uid in users:
+        update = fake_update(uid, "🎯 Get Word")
+        started = perf_counter()
+        await lingo.main_menu_handler(update, fake_context())
+        latencies.append(perf_counter() - started)
+        assert update.message.replies[0].startswith("Word: w")
+    return latencies
+
+
+# "🎯 Get Word" for other users takes as long during a slow AI call as it
+# does with the bot idle.
+def test_slow_ai_call_keeps_other_handlers_flat(bot_db, stub_server, monkeypatch):
+    fake_groq(stub_server, monkeypatch)
+    add_words(50)
+
+    async def run():
+        idle = await get_word_latencies(range(100, 120))
+
+        update = fake_update(1, "run")
+        adding = asyncio.create_task(lingo.ai_add(update, fake_context()))
+        await asyncio.sleep(0.2)
+        busy = await get_word_latencies(range(200, 220))
+        in_flight = not adding.done()
+
+        await adding
+        return idle, busy, in_flight, update.message.replies
+
+    idle, busy, in_flight, replies = asyncio.run(run())
+
+    assert in_flight
+    assert max(busy) < max(idle) + 0.1
+    assert replies == ["Word added (Dictionary + AI)."]
+    row = lingo.query("SELECT definition, level FROM personal_words WHERE user_id=1")[0]
+    assert (row["definition"], row["level"]) == ("to move fast on foot", "A1")
+
+
+# /cancel stops the wait on the AI right away and nothing is saved.
+def test_cancel_stops_ai_call(bot_db, stub_server, monkeypatch):
+    fake_groq(stub_server, monkeypatch)
+
+    async def run():
+        update = fake_update(1, "run")
+        adding = asyncio.create_task(lingo.ai_add(update, fake_context()))
+        await asyncio.sleep(0.2)
+
+        started = perf_counter()
+        await lingo.cancel(fake_update(1, "/cancel"), fake_context())
+        result = await adding
+        return result, perf_counter() - started, update.message.replies
+
+    result, waited, replies = asyncio.run(run())
+
+    assert result == lingo.ConversationHandler.END
+    assert waited < AI_DELAY / 4
+    assert replies == []
+    assert lingo.query("SELECT COUNT(*) FROM personal_words")[0][0] == 0
+    assert lingo._ai_inflight == {}
@@ -0,0 +1,48 @@
+import asyncio
+from time import perf_counter
+
+import lingo
+from conftest import slow, fake_update, fake_context
+
+LOOKUP_DELAY = 1.0
+
+PAGE = b"""<html><body><div class="entry-body">
+<span class="pos dpos">verb</span>
+<span class="epp-xref dxref">A1</span>
+<div class="def ddef_d db">to move fast on foot</div>
+<div class="examp dexamp">She runs every day.</div>
+<span class="ipa dipa">r\xca\x8cn</span>
+</div></body></html>"""
+
+
+# While one user's dictionary lookup waits on a slow site, other users'
+# handlers still answer right away.
+def test_slow_lookup_does_not_block_other_users(bot_db, stub_server, monkeypatch):
+    base = stub_server(slow(LOOKUP_DELAY, 200, "text/html; charset=utf-8", PAGE))
+    monkeypatch.setattr(lingo, "CAMBRIDGE_URL", base + "/cambridge/{}")
+    monkeypatch.setattr(lingo, "SCRAPERS", [lingo.scrape_cambridge])
+    monkeypatch.setattr(lingo, "SOURCE_STATS", {})
+    monkeypatch.setattr(lingo, "_host_limits", {})
+
+    async def run():
+        try:
+            lookup = asyncio.create_task(lingo.get_word_from_web("run"))
+            await asyncio.sleep(0.1)
+
+            latencies = []
+            for uid in range(1, 21):
+                started = perf_counter()
+                await lingo.start(fake_update(uid), fake_context())
+                latencies.append(perf_counter() - started)
+            in_flight = not lookup.done()
+
+            return await lookup, latencies, in_flight
+        finally:
+            await lingo.close_http_client()
+
+    data, latencies, in_flight = asyncio.run(run())
+
+    assert in_flight
+    assert max(latencies) < LOOKUP_DELAY / 4
+    assert data["definition"] == "to move fast on foot"
+    assert data["source"] == "Cambridge"